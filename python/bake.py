@@ -0,0 +1,66 @@
+#!/usr/bin/python3
+"""Bake a trigger or an effect into a clip
+
+Renders it headless (no network, no simulator) until it's done and writes
+the frames to a clip file, which Rosary.load_clip() (or server.py --clips)
+can play back instead of running it live.
+
+    ./bake.py trigger left_nail                     # writes left_nail.clip
+    ./bake.py effect throb --bead-set cross --frames 300 -o throb.clip
+"""
+import argparse
+
+from mp import clip, output, rosary
+
+
+def start_trigger(name):
+    def start(r):
+        r.fire_trigger(name)
+    return start
+
+
+def start_effect(name, bead_set, color, frames):
+    def start(r):
+        effect_id = r.add_effect(name=name, bead_set=bead_set, color=color)
+        r.bin.effect(effect_id).duration = frames
+    return start
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("kind", choices=["trigger", "effect"],
+        help="what to bake")
+    parser.add_argument("name",
+        help="name of the trigger or effect")
+    parser.add_argument("-o", "--output",
+        help="clip file to write (default: <name>.clip)")
+    parser.add_argument("--bead-set",
+        default="all", help="effect: bead set to run the effect on")
+    parser.add_argument("--color",
+        default="white", help="effect: color name")
+    parser.add_argument("--frames",
+        type=int, default=300, help="effect: how many frames to bake")
+    parser.add_argument("--seed",
+        default="0", help="seed for random effects, so baking again gives the same clip")
+    parser.add_argument("--max-frames",
+        type=int, default=30 * 60, help="stop baking after this many frames")
+
+    args = parser.parse_args()
+
+    r = rosary.Rosary(sink=output.NullSink())
+    r.seed(args.seed)
+    if args.kind == "trigger":
+        if args.name not in r.trigger_registry:
+            parser.error("unknown trigger {}, try one of {}".format(
+                args.name, ", ".join(sorted(r.trigger_registry))))
+        start = start_trigger(args.name)
+    else:
+        if args.name not in r.effect_registry:
+            parser.error("unknown effect {}, try one of {}".format(
+                args.name, ", ".join(sorted(r.effect_registry))))
+        start = start_effect(args.name, args.bead_set, args.color, args.frames)
+
+    path = args.output or "{}.clip".format(args.name)
+    frame_count = clip.bake(r, start, path, max_frames=args.max_frames)
+    print("wrote {} frames to {}".format(frame_count, path))
@@ -0,0 +1,359 @@
+#!/usr/bin/python3
+"""Benchmarks for the mp frame pipeline.
+
+Nothing here needs the network or a simulator: output goes to a NullSink.
+
+    ./benchmark.py encoder     # /bead encoding, old OscMessageBuilder path vs BeadEncoder
+    ./benchmark.py knobs       # adding and removing effects (and their knobs)
+    ./benchmark.py effects     # cost of every registered effect, see bench_effects()
+    ./benchmark.py threads     # a scene of cross effects rendered with 1, 2, 4... threads
+"""
+import argparse
+import json
+import platform
+import random
+import struct
+import sys
+import time
+import tracemalloc
+import traceback
+
+import numpy
+
+from pythonosc import osc_message_builder
+
+from mp import color, frame, interpolator, output, pacer, rosary
+from mp.effects import throb
+from mp.rosary import Bead, Updater
+
+# the three classes of LEDs, as created by Rosary
+LED_CLASSES = [('rosary', 60), ('base', 9), ('cross', 480)]
+
+
+class ListSink:
+    """Keeps a copy of every packet sent to it."""
+
+    def __init__(self):
+        self.packets = []
+
+    def send(self, payload):
+        self.packets.append(bytes(payload))
+
+
+def legacy_update(updater):
+    """The way Updater.update() used to encode a frame, kept for comparison."""
+    msg = osc_message_builder.OscMessageBuilder(address = "/bead")
+    msg.add_arg(updater.name)                 # name (class)
+    msg.add_arg(int(0))                       # base
+    msg.add_arg(int(len(updater.bead_list)))  # length
+
+    payload = bytearray()
+    for bead in updater.bead_list:
+        payload.extend(struct.pack('!HHHH',
+                                   int(bead.color.r * 0xffff),
+                                   int(bead.color.g * 0xffff),
+                                   int(bead.color.b * 0xffff),
+                                   int(bead.color.brightness)
+        ))
+
+    msg.add_arg(bytes(payload))
+
+    updater.sink.send(msg.build().dgram)
+
+
+def legacy_expose_effect_knobs(knobs, effect):
+    """The way Rosary.expose_effect_knobs() used to work, kept for comparison."""
+    for fn_name, fn in effect.dm.exposed_methods.items():
+        if fn_name in knobs.keys():
+            knobs[fn_name].append( (fn, effect) )
+        else:
+            knobs[fn_name] = [ (fn, effect) ]
+
+
+def legacy_unexpose_effect_knobs(knobs, effect):
+    """The way Rosary.unexpose_effect_knobs() used to work, kept for comparison."""
+    for fn_name in list(knobs):
+        mappings = knobs[fn_name]
+        for mapping in reversed(mappings):
+            if effect == mapping[1]:
+                mappings.remove(mapping)
+        if len(mappings) < 1:
+            knobs.pop(fn_name)
+
+
+def headless_rosary():
+    """A Rosary that needs no network, no dispatcher and no simulator."""
+    r = rosary.Rosary(sink=output.NullSink())
+    # random effects do the same thing every run
+    r.seed(0)
+    return r
+
+
+def time_frames(fn, frames):
+    """Call fn() frames times, return the mean wall-clock time per call in µs."""
+    start = time.perf_counter()
+    for i in range(frames):
+        fn()
+    return (time.perf_counter() - start) / frames * 1e6
+
+
+def bench_encoder(args):
+    sink = output.NullSink()
+    updaters = []
+    for name, count in LED_CLASSES:
+        fb = frame.FrameBuffer(name, count)
+        fb.data[:, 0:4] = [[random.random() for c in range(4)] for i in range(count)]
+        beads = [Bead(i, fb) for i in range(count)]
+        updaters.append(Updater(name=name, bead_list=beads, frame_buffer=fb, sink=sink))
+
+    # make sure both paths put the same bytes on the wire
+    for updater in updaters:
+        updater.sink = ListSink()
+        legacy_update(updater)
+        updater.update()
+        assert updater.sink.packets[0] == updater.sink.packets[1], updater.name
+        updater.sink = sink
+
+    def legacy_frame():
+        for updater in updaters:
+            legacy_update(updater)
+
+    def encoder_frame():
+        for updater in updaters:
+            updater.update()
+
+    legacy = time_frames(legacy_frame, args.frames)
+    encoded = time_frames(encoder_frame, args.frames)
+
+    print("encoding {} beads per frame, {} frames".format(
+        sum(count for name, count in LED_CLASSES), args.frames))
+    print("  legacy:  {:10.1f} µs/frame".format(legacy))
+    print("  encoder: {:10.1f} µs/frame".format(encoded))
+    print("  speedup: {:10.1f}x".format(legacy / encoded))
+
+
+def bench_knobs(args):
+    r = headless_rosary()
+    effects = [throb.Throb(r.set_registry['all'], color=color.Color(1, 0, 0), rosary=r)
+               for i in range(args.effects)]
+
+    # the whole thing, through the Rosary
+    start = time.perf_counter()
+    for e in effects:
+        r.add_effect_object(e)
+    added = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for e in effects:
+        r.del_effect(e.id)
+    removed = time.perf_counter() - start
+    assert not r.knobs
+
+    # just the knob bookkeeping, old vs new
+    for i, e in enumerate(effects):
+        e.id = i + 1
+
+    knobs = {}
+    start = time.perf_counter()
+    for e in effects:
+        legacy_expose_effect_knobs(knobs, e)
+    for e in effects:
+        legacy_unexpose_effect_knobs(knobs, e)
+    legacy = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for e in effects:
+        r.expose_effect_knobs(e)
+    for e in effects:
+        r.unexpose_effect_knobs(e)
+    indexed = time.perf_counter() - start
+
+    print("adding and removing {} effects".format(args.effects))
+    print("  add_effect_object: {:10.1f} µs/effect".format(added / args.effects * 1e6))
+    print("  del_effect:        {:10.1f} µs/effect".format(removed / args.effects * 1e6))
+    print("knob bookkeeping, expose + unexpose")
+    print("  legacy:  {:10.1f} ms".format(legacy * 1e3))
+    print("  indexed: {:10.1f} ms".format(indexed * 1e3))
+    print("  speedup: {:10.1f}x".format(legacy / indexed))
+
+
+# the bead sets every effect is run on by bench_effects()
+EFFECT_BEAD_SETS = ['all', 'ring', 'cross', 'base']
+
+
+def run_effect(r, effect_name, bead_set, frames, warmup=10):
+    """
+    Run one effect on its own for frames frames and return a dict of results.
+    Each frame is a whole render_frame() + transmit_frame(), so the numbers
+    include clearing, compositing and encoding the frame.
+    """
+    r.clear_effects()
+    r.add_effect(name=effect_name, bead_set=bead_set, color='red')
+
+    def frame():
+        r.render_frame()
+        r.transmit_frame()
+
+    for i in range(warmup):
+        frame()
+
+    times = []
+    for i in range(frames):
+        start = time.perf_counter()
+        frame()
+        times.append(time.perf_counter() - start)
+
+    # allocations are measured in a second pass, tracemalloc slows
+    # everything down too much to time with it on.
+    # peak: the most memory a frame had allocated at once (temporaries
+    # included); blocks: what frames leave allocated, i.e. leaks and caches
+    # filling up, not how many allocations a frame makes
+    tracemalloc.start()
+    blocks = sys.getallocatedblocks()
+    peak = 0
+    for i in range(frames):
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        else:
+            # Python < 3.9: forgetting what's been traced resets the peak too
+            tracemalloc.clear_traces()
+        before = tracemalloc.get_traced_memory()[0]
+        frame()
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+    blocks = sys.getallocatedblocks() - blocks
+    tracemalloc.stop()
+
+    mean = sum(times) / len(times)
+    return {
+        'mean_us': round(mean * 1e6, 1),
+        'p99_us': round(pacer.percentile(times, 99) * 1e6, 1),
+        'max_us': round(max(times) * 1e6, 1),
+        'fps': round(1 / mean, 1),
+        'peak_bytes_per_frame': peak,
+        'retained_blocks_per_frame': round(blocks / frames, 2),
+        # effects with a duration may be gone before the run is over
+        'finished': not r.bin.effects,
+    }
+
+
+def bench_effects(args):
+    r = headless_rosary()
+    bead_sets = args.bead_sets or EFFECT_BEAD_SETS
+    effect_names = args.effect_names or sorted(r.effect_registry)
+
+    results = []
+    for effect_name in effect_names:
+        for bead_set in bead_sets:
+            result = {'effect': effect_name, 'bead_set': bead_set}
+            try:
+                result.update(run_effect(r, effect_name, bead_set, args.frames))
+            except Exception as e:
+                # some effects don't cope with every bead set, note it and move on
+                result['error'] = traceback.format_exception_only(type(e), e)[-1].strip()
+            results.append(result)
+
+            if 'error' in result:
+                print("{:24} {:6} ERROR {}".format(effect_name, bead_set, result['error']))
+            else:
+                print("{effect:24} {bead_set:6} {mean_us:10.1f} µs mean {p99_us:10.1f} µs p99 "
+                      "{fps:10.1f} fps {peak_bytes_per_frame:8} B peak".format(**result))
+
+    r.clear_effects()
+
+    report = {
+        'benchmark': 'effects',
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'machine': platform.machine(),
+        'frames': args.frames,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print("results written to {}".format(args.output))
+
+
+# what bench_threads() fills the cross with, round-robin
+THREAD_SCENE = ['sine_wave', 'throb', 'vibration_fixed', '3phase_sine_wave']
+
+
+def bench_threads(args):
+    r = headless_rosary()
+    for i in range(args.scene):
+        r.add_effect(name=THREAD_SCENE[i % len(THREAD_SCENE)], bead_set='cross', color='red')
+
+    print("rendering {} cross effects, {} frames".format(args.scene, args.frames))
+    single = None
+    for threads in args.threads or [1, 2, 4]:
+        r.set_render_threads(threads)
+        mean = time_frames(r.render_frame, args.frames)
+        if single is None:
+            single = mean
+        print("  {:2} threads: {:10.1f} µs/frame {:6.2f}x".format(threads, mean, single / mean))
+
+    r.set_render_threads(1)
+    r.clear_effects()
+
+
+def bench_interpolate(args):
+    r = headless_rosary()
+    for i in range(args.scene):
+        r.add_effect(name=THREAD_SCENE[i % len(THREAD_SCENE)], bead_set='cross', color='red')
+    factor = args.factor
+
+    def rendered():
+        r.render_frame()
+        r.transmit_frame()
+
+    interpolated = interpolator.FrameInterpolator(r, factor)
+
+    def blended():
+        interpolated.blend(0.5)
+        r.transmit_frame()
+
+    print("{} cross effects, {} frames, {}x the frame rate".format(args.scene, args.frames, factor))
+    render = time_frames(rendered, args.frames)
+    blend = time_frames(blended, args.frames)
+    native = render * factor
+    cheap = render + (blend * (factor - 1))
+    print("  render + send:       {:10.1f} µs/frame".format(render))
+    print("  blend + send:        {:10.1f} µs/frame".format(blend))
+    print("  rendered {}x:         {:10.1f} µs/base frame".format(factor, native))
+    print("  interpolated {}x:     {:10.1f} µs/base frame {:6.2f}x".format(factor, cheap, native / cheap))
+    r.clear_effects()
+
+
+BENCHMARKS = {
+    'encoder': bench_encoder,
+    'knobs': bench_knobs,
+    'effects': bench_effects,
+    'threads': bench_threads,
+    'interpolate': bench_interpolate,
+}
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS),
+        help="which benchmark to run")
+    parser.add_argument("--frames",
+        type=int, default=1000, help="number of frames to run")
+    parser.add_argument("--effects",
+        type=int, default=1000, help="number of effects to add and remove")
+    parser.add_argument("--effect", dest="effect_names", action="append",
+        help="effects: only run this effect (may be repeated)")
+    parser.add_argument("--bead-set", dest="bead_sets", action="append",
+        help="effects: only use this bead set (may be repeated)")
+    parser.add_argument("--scene",
+        type=int, default=16, help="threads: number of effects in the scene")
+    parser.add_argument("--threads", type=int, action="append",
+        help="threads: render with this many threads (may be repeated)")
+    parser.add_argument("--factor",
+        type=int, default=4, help="interpolate: frames sent per frame rendered")
+    parser.add_argument("--output",
+        default="benchmark-effects.json", help="effects: where to write the JSON results")
+
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
@@ -0,0 +1,123 @@
+import os
+import struct
+
+import numpy
+
+from mp import frame
+
+
+class Clip:
+    """
+    Clip is a baked (pre-rendered) sequence of frames, see bake().
+
+    The file starts with a header:
+
+        magic 'MPCL', version (uint16), class count (uint16),
+        frame count (uint32), fps (float32)
+
+    followed by (name, bead count) for each class of LEDs (16 byte
+    null-padded name, uint32), then the frames: frame count x beads (all the
+    classes, one after the other) x [r, g, b, a, brightness], little-endian
+    uint16. Colors are scaled to 0-0xffff, brightness is stored as is.
+
+    The frames are memory-mapped, not read in.
+    """
+
+    MAGIC = b'MPCL'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHHIf')
+    CLASS = struct.Struct('<16sI')
+    SCALE = 0xffff
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.splitext(os.path.basename(path))[0]
+
+        with open(path, 'rb') as f:
+            magic, version, class_count, self.frame_count, self.fps = \
+                self.HEADER.unpack(f.read(self.HEADER.size))
+            if magic != self.MAGIC or version != self.VERSION:
+                raise ValueError("{} is not a version {} clip".format(path, self.VERSION))
+
+            self.classes = []
+            for i in range(class_count):
+                name, count = self.CLASS.unpack(f.read(self.CLASS.size))
+                self.classes.append((name.rstrip(b'\0').decode('ascii'), count))
+
+        offset = self.HEADER.size + (class_count * self.CLASS.size)
+        self.bead_count = sum(count for name, count in self.classes)
+        shape = (self.frame_count, self.bead_count, frame.FrameBuffer.CHANNELS)
+        if self.frame_count:
+            self.frames = numpy.memmap(path, dtype='<u2', mode='r', offset=offset, shape=shape)
+        else:
+            # can't map nothing
+            self.frames = numpy.empty(shape, dtype='<u2')
+
+    def __len__(self):
+        return self.frame_count
+
+    def __repr__(self):
+        return "Clip(name={}, frames={})".format(self.name, self.frame_count)
+
+    def read_frame(self, n, frame_buffer):
+        """Copy frame n into a FrameBuffer (with as many rows as the clip has beads)."""
+        data = frame_buffer.data
+        raw = self.frames[n]
+        numpy.multiply(raw[:, 0:4], 1 / self.SCALE, out=data[:, 0:4])
+        data[:, 4] = raw[:, 4]
+
+    @classmethod
+    def write(cls, path, classes, frames, fps=30):
+        """
+        Write a clip. classes is a list of (name, bead count), frames an
+        iterable of (beads, 5) float arrays as found in a FrameBuffer.
+        """
+        with open(path, 'wb') as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, len(classes), 0, fps))
+            for name, count in classes:
+                f.write(cls.CLASS.pack(name.encode('ascii'), count))
+
+            frame_count = 0
+            raw = None
+            for data in frames:
+                if raw is None:
+                    raw = numpy.empty(data.shape, dtype='<u2')
+                scaled = numpy.clip(numpy.rint(data[:, 0:4] * cls.SCALE), 0, cls.SCALE)
+                raw[:, 0:4] = scaled
+                raw[:, 4] = data[:, 4]
+                f.write(raw.tobytes())
+                frame_count += 1
+
+            # now we know how many frames there are
+            f.seek(0)
+            f.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, len(classes), frame_count, fps))
+
+        return frame_count
+
+
+def rosary_classes(rosary):
+    """The (name, bead count) of each class of LEDs of a Rosary, in canvas order."""
+    return [(updater.name, len(updater.frame_buffer)) for updater in rosary.updater_list]
+
+
+def bake(rosary, start, path, max_frames=30 * 60):
+    """
+    Render whatever start(rosary) sets going (fire a trigger, add an effect)
+    on a headless Rosary, frame by frame, until all of its effects are done
+    (or max_frames have been rendered) and write the frames to a clip.
+
+    Frames are rendered on a transparent background, so a ClipPlayer
+    (see mp.effects.clip_player) can composite them over other effects.
+    Returns the number of frames written.
+    """
+    start(rosary)
+
+    def frames():
+        for n in range(max_frames):
+            if not rosary.bin.effects:
+                return
+            rosary.canvas.clear_transparent()
+            rosary.bin.next(rosary.frame_time)
+            yield rosary.canvas.data
+
+    return Clip.write(path, rosary_classes(rosary), frames(), fps=1 / rosary.frame_time)
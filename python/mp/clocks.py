@@ -0,0 +1,42 @@
+import time
+
+
+class SystemClock:
+    """The real thing: time.perf_counter() and time.sleep()."""
+
+    virtual = False
+
+    def now(self):
+        return time.perf_counter()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def advance(self, seconds):
+        """Real time moves on by itself, nothing to do."""
+        pass
+
+
+class VirtualClock:
+    """
+    VirtualClock only moves when it's told to: sleeping on it (or
+    advance()) just moves it forward. A Rosary with one renders as fast as
+    the CPU allows, while everything that looks at the clock (the pacer, its
+    statistics) sees time go by frame by frame, as it would in a show.
+    """
+
+    virtual = True
+
+    def __init__(self, start=0.0):
+        self.t = start
+
+    def now(self):
+        return self.t
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.t += seconds
+
+    def advance(self, seconds):
+        self.t += seconds
@@ -26,30 +26,40 @@ class Color:
     def set(self, color, intensity=1, alpha=None):
         """blend the r, g, b and a values in a Color object,
         using the Porter and Duff equation for alpha blending
-        intensity is an optional argument."""
+        intensity is an optional argument, it scales the blended result."""
 
         if alpha == None:
             # take alpha from supplied color object
             alpha = color.a
 
-        # this part is the porter-duff equation
-        self.a = max(1, alpha + (self.a * (1 - alpha)))
-        if self.a == 0:
+        # this part is the porter-duff "over" equation
+        a = alpha + (self.a * (1 - alpha))
+        if a == 0:
             self.r = 0
             self.g = 0
             self.b = 0
         else:
-            self.r = (((color.r * alpha) + (self.r * (1 - alpha))) / self.a) * intensity
-            self.g = (((color.g * alpha) + (self.g * (1 - alpha))) / self.a) * intensity
-            self.b = (((color.b * alpha) + (self.b * (1 - alpha))) / self.a) * intensity
+            # how much of our own color shows through
+            weight = self.a * (1 - alpha)
+            self.r = (((color.r * alpha) + (self.r * weight)) / a) * intensity
+            self.g = (((color.g * alpha) + (self.g * weight)) / a) * intensity
+            self.b = (((color.b * alpha) + (self.b * weight)) / a) * intensity
+
+        self.a = a
 
-        self.a = alpha
+    # True if next() changes the color, see Effect.reuse_layer()
+    dynamic = False
 
-    def next(self):
+    def next(self, steps=1):
         """No-op in most cases. This is used by child objects that implement
-        dynamic color features."""
+        dynamic color features, which move on by steps (see
+        mp.effects.effect.Effect.supernext())."""
         pass
 
+    def key(self):
+        """The r, g, b, a and brightness values as a (hashable) tuple."""
+        return (self.r, self.g, self.b, self.a, self.brightness)
+
 
 
 ColorMapStep = namedtuple('ColorMapStep', 'step color')
@@ -107,12 +117,12 @@ class ColorMap(Color):
 
         # first check lower bound
         if (value <= self.colormap[0].step):
-            self.set(self.colormap[0].color)
+            self._set(self.colormap[0].color)
             return
 
         # then upper bound
         if (value >= self.colormap[-1].step):
-            self.set(self.colormap[-1].color)
+            self._set(self.colormap[-1].color)
             return
 
         # now search for steps to interpolate color between
@@ -120,7 +130,7 @@ class ColorMap(Color):
         for m1 in self.colormap[1:]:
             # check easy case before doing math
             if (value == m1.step):
-                self.set(m1.color)
+                self._set(m1.color)
                 return
 
             if (value < m1.step):
@@ -138,6 +148,9 @@ class ColorMapFade(Color):
     """
     ColorMapFade() is a dynamic Color() which cycles through a provided ColorMap() over time steps.
     """
+
+    dynamic = True
+
     def __init__(self, colormap=ColorMap(colormap=[ColorMapStep(0, Color(0, 0, 0)), ColorMapStep(1, Color(1, 1, 1))]), time=30, name='color_map_fade'):
         super().__init__(r=colormap.colormap[0].color.r,
                          g=colormap.colormap[0].color.g,
@@ -151,11 +164,16 @@ class ColorMapFade(Color):
     def __repr__(self):
         return "ColorMap(r={}, g={}, b={}, a={}, colormap={}, time={})".format(self.r, self.g, self.b, self.a, self.colormap, self.time)
 
-    def next(self):
-        self.delta += self.delta_t
+    def next(self, steps=1):
+        self.delta += self.delta_t * steps
+        # bounce off the ends: a big step (a slow frame) goes past one, or
+        # even both, and has to come back by as much to stay in phase
+        while (self.delta > 1) or (self.delta < 0):
+            self.delta = (2 - self.delta) if self.delta > 1 else -self.delta
+            self.delta_t *= -1
         self.colormap.map(self.delta)
-        self.set(self.colormap)
-        if (self.delta >= 1) or (self.delta <= 0):
+        self._set(self.colormap)
+        if (self.delta == 1 and self.delta_t > 0) or (self.delta == 0 and self.delta_t < 0):
             self.delta_t *= -1
 
 
@@ -177,8 +195,8 @@ class ColorFade(ColorMapFade):
     def __repr__(self):
         return "ColorFade(start={}, finish={}, time={})".format(self.start, self.finish, self.time)
 
-    def next(self):
-        super().next()
+    def next(self, steps=1):
+        super().next(steps)
 
 
 rainbow_map = [ColorMapStep(0, Color(1, 0, 0)), ColorMapStep(1/3, Color(0, 1, 0)), ColorMapStep(2/3, Color(0, 0, 1)), ColorMapStep(1, Color(1, 0, 0))]
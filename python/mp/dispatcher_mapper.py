@@ -1,3 +1,6 @@
+import functools
+
+
 class DispatcherMapper:
 
     def __init__(self):
@@ -5,8 +8,18 @@ class DispatcherMapper:
 
     def expose(self):
         def decorator(fn):
-            self.exposed_methods[fn.__name__] = fn
-            return fn
+            # turning a knob may change what an object looks like, so tell
+            # objects that care (see Effect.invalidate())
+            @functools.wraps(fn)
+            def knob(obj, *args, **kwargs):
+                result = fn(obj, *args, **kwargs)
+                invalidate = getattr(obj, 'invalidate', None)
+                if invalidate is not None:
+                    invalidate()
+                return result
+
+            self.exposed_methods[fn.__name__] = knob
+            return knob
         return decorator
 
     def invoke_exposed(self, unused_addr, hacked_variables, *args, **kwargs):
@@ -25,5 +25,6 @@ __all__ = [
     'roulette',
     'shooter',
     'launcher',
+    'clip_player',
     'random_fill'
 ]
@@ -1,5 +1,9 @@
+import concurrent.futures
 import copy
-from mp import color
+
+import numpy
+
+from mp import color, frame
 from mp.effects import effect
 
 class Bin(effect.Effect):
@@ -9,6 +13,18 @@ class Bin(effect.Effect):
     removing effects to and from it.
 
     In other words, its turtles all the way down.
+
+    Each effect draws on a layer of its own: the Bin clears the rosary's
+    canvas, lets the effect draw, and keeps the result. Once all the effects
+    are done, the layers are composited, in order, onto what was on the
+    canvas before (each with the effect's blend_mode and opacity). An
+    effect's layer is reused as it is when the effect says nothing would
+    change (Effect.reuse_layer()). With layered False, or without a rosary,
+    effects draw straight onto the canvas, one after the other.
+
+    With render threads (set_render_threads()), effects that can (see
+    Effect.parallel) draw on their layers in a thread pool while the rest
+    are rendered as usual; the layers are still composited in order.
     """
 
     # Wish there were a better way than requiring this every time
@@ -16,15 +32,45 @@ class Bin(effect.Effect):
 
     def __init__(self, bead_set, **kwargs):
         super().__init__(name="bin", bead_set=bead_set, **kwargs)
-        self.effects = []
+        # id -> Effect, in the order the effects are rendered
+        self.effect_map = {}
+        # the same effects as a tuple, rebuilt whenever effect_map changes
+        self.effect_order = ()
         self.effect_id_num = 0
+        # effects deleted while next() is running are removed once it's done
+        self.in_next = False
+        self.pending_removal = []
+        # an mp.profiler.EffectProfiler, when profiling is on
+        self.profiler = None
+        # give each effect a layer of its own (see the class docstring)
+        self.layered = True
+        # effect id -> FrameBuffer the effect was last rendered into
+        self.layers = {}
+        # what was on the canvas before the effects were rendered
+        self.backdrop = None
+        # the result of the last composite(), reused as long as no layer and
+        # nothing underneath them has changed
+        self.composited = None
+        self.layers_changed = True
+        # a concurrent.futures.ThreadPoolExecutor when rendering with threads
+        self.render_threads = 1
+        self.pool = None
+        # the dt next() was called with, for the effects
+        self.frame_dt = None
+
+    @property
+    def effects(self):
+        """The active effects, in rendering order."""
+        return self.effect_order
+
+    def update_order(self):
+        """Call whenever effects are added, removed or reordered."""
+        self.effect_order = tuple(self.effect_map.values())
+        self.layers_changed = True
 
     def effect(self, id):
         """Return the Effect object of an active effect by specifying the Effect id."""
-        for e in self.effects:
-            if e.id == id:
-                return e
-        return None    
+        return self.effect_map.get(id)
 
     def effect_id(self):
         self.effect_id_num += 1
@@ -38,9 +84,10 @@ class Bin(effect.Effect):
         effect.id = self.effect_id()
         # Since rosary holds the dispatcher and the effect doesn't
         # know about rosary on init, we can't map to dispatcher yet either
-        self.effects.append(effect)
         effect.rosary = self.rosary
         effect.my_bin = self
+        self.effect_map[effect.id] = effect
+        self.update_order()
 
         return effect.id
 
@@ -53,24 +100,54 @@ class Bin(effect.Effect):
             super().set_rosary(rosary)
 
     def del_effect(self, id):
-        """Delete an active effect by id."""
-        effect = self.effect(id)
+        """Delete an active effect by id.
+
+        If this happens while the effects are being rendered (an effect
+        finishing, or deleting another one), the effect is removed at the end
+        of the frame, so no other effect misses its turn.
+        """
+        if self.in_next:
+            self.pending_removal.append(id)
+            return
+
+        effect = self.effect_map.pop(id, None)
 
         if effect is not None:
-            #effect_paths = [effect.generate_osc_path(fn) for fn in\
-            #                effect.dm.registered_methods.keys()]
-            #self.effect_paths_to_unregister.extend(effect_paths)
+            self.update_order()
             self.rosary.unexpose_effect_knobs(effect)
-            self.effects.remove(effect)
+            self.layers.pop(id, None)
+            if self.profiler is not None:
+                self.profiler.forget(id)
+
+    def move_effect(self, id, position):
+        """Move an active effect to position in the rendering order
+        (0 is rendered first, i.e. at the bottom). Negative positions count
+        from the end, like list.insert()."""
+        effect = self.effect_map.get(id)
+        if effect is None:
+            return
+
+        order = [e for e in self.effect_map.values() if e is not effect]
+        order.insert(position, effect)
+        self.set_effect_order([e.id for e in order])
+
+    def set_effect_order(self, ids):
+        """Render the effects in the order given by ids. Effects that aren't
+        mentioned keep their relative order, after the ones that are."""
+        effect_map = {}
+        for id in ids:
+            if id in self.effect_map:
+                effect_map[id] = self.effect_map[id]
+        for id, effect in self.effect_map.items():
+            effect_map.setdefault(id, effect)
+
+        self.effect_map = effect_map
+        self.update_order()
 
     def clear_effects(self):
         """Remove all active effects. This stops all activity on the rosary."""
-        # There's some weird race condition where del_effect's call to
-        # self.effects.remove doesn't reorder the list in time if we use
-        # a for loop, so do this instead
-        while self.effects:
-            effect = self.effects[0]
-            self.del_effect(effect.id)
+        for id in list(self.effect_map):
+            self.del_effect(id)
 
     def clear_effects_fade(self):
         """
@@ -80,9 +157,158 @@ class Bin(effect.Effect):
         for eff in self.effects:
             eff.fade_out(30)
 
-    def next(self):
-        for effect in self.effects:
-            effect.supernext()
+    def canvas(self):
+        """The FrameBuffer effects draw on, or None if they should draw
+        straight into the frame."""
+        if not self.layered:
+            return None
+        return getattr(self.rosary, 'canvas', None)
+
+    def set_render_threads(self, threads=1):
+        """Render layers with a pool of threads, or on the calling thread
+        (the default) if threads is 1 or less. Effects are rendered in order
+        only with a single thread, so that's the one to use when the output
+        has to be exactly the same every time."""
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        self.render_threads = max(threads, 1)
+        if threads > 1:
+            self.pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=threads, thread_name_prefix='render')
+
+    def layer(self, effect, canvas):
+        """Return the layer of effect, creating it if need be."""
+        layer = self.layers.get(effect.id)
+        if layer is None:
+            layer = self.layers[effect.id] = frame.FrameBuffer(effect.name, len(canvas))
+        return layer
+
+    def render_effect(self, effect):
+        """Render effect into its layer, or just advance it if its layer from
+        last frame can be reused."""
+        layer = self.layers.get(effect.id)
+        if layer is not None and effect.reuse_layer():
+            effect.advance(self.frame_dt)
+            return
+
+        canvas = self.rosary.canvas
+        layer = self.layer(effect, canvas)
+        canvas.clear_transparent()
+        effect.supernext(self.frame_dt)
+        numpy.copyto(layer.data, canvas.data)
+        self.layers_changed = True
+
+    def parallel(self, effect, canvas):
+        """Can effect draw straight on its layer rather than on canvas?"""
+        frame_buffer = effect.frame_buffer
+        return (effect.parallel and frame_buffer is not None and
+                (frame_buffer is canvas or frame_buffer.parent is canvas))
+
+    def render_layers(self, jobs):
+        """Let each effect draw on its layer instead of the canvas, jobs is a
+        list of (effect, layer). Runs in a pool thread."""
+        for effect, layer in jobs:
+            if effect.reuse_layer():
+                effect.advance(self.frame_dt)
+                continue
+
+            # point the effect at the same rows of its layer
+            frame_buffer = effect.frame_buffer
+            effect.frame_buffer = layer.view(frame_buffer.name, frame_buffer.offset, len(frame_buffer))
+            try:
+                layer.clear_transparent()
+                effect.supernext(self.frame_dt)
+            finally:
+                effect.frame_buffer = frame_buffer
+            self.layers_changed = True
+
+    def render_threaded(self, canvas, order):
+        """Render the effects that can into their layers in the pool and the
+        rest on the canvas, at the same time."""
+        jobs = []
+        serial = []
+        for effect in order:
+            if self.parallel(effect, canvas):
+                # a new layer has to be rendered, whatever reuse_layer() says
+                if effect.id not in self.layers:
+                    effect.invalidate()
+                jobs.append((effect, self.layer(effect, canvas)))
+            else:
+                serial.append(effect)
+
+        # one batch of effects per thread, a task per effect costs too much
+        threads = self.render_threads
+        futures = [self.pool.submit(self.render_layers, jobs[i::threads])
+                   for i in range(min(threads, len(jobs)))]
+
+        try:
+            for effect in serial:
+                self.render_effect(effect)
+        finally:
+            concurrent.futures.wait(futures)
+        for future in futures:
+            future.result()
+
+    def render_direct(self, effect):
+        """Let effect draw straight onto the frame."""
+        effect.supernext(self.frame_dt)
+
+    def next(self, dt=None):
+        """Render all the effects, moving them on by dt seconds (see
+        Effect.supernext())."""
+        self.frame_dt = dt
+        canvas = self.canvas()
+        if canvas is None:
+            render = self.render_direct
+        else:
+            render = self.render_effect
+            if self.backdrop is None or self.backdrop.shape != canvas.data.shape:
+                self.backdrop = numpy.empty_like(canvas.data)
+                self.composited = None
+            if not numpy.array_equal(self.backdrop, canvas.data):
+                numpy.copyto(self.backdrop, canvas.data)
+                self.layers_changed = True
+
+        self.in_next = True
+        try:
+            order = self.effect_order
+            if self.profiler is not None:
+                # profiling times one effect at a time
+                self.profiler.run(order, render)
+            elif self.pool is not None and canvas is not None:
+                self.render_threaded(canvas, order)
+            else:
+                for effect in order:
+                    render(effect)
+
+            if canvas is not None:
+                self.composite(canvas, order)
+
+            for effect in order:
+                if (effect.finished):
+                    self.del_effect(effect.id)
+        finally:
+            self.in_next = False
+
+        while self.pending_removal:
+            self.del_effect(self.pending_removal.pop())
+
+    def composite(self, canvas, order):
+        """Put the backdrop back on the canvas and composite the layers of
+        the effects in order on top of it."""
+        if not self.layers_changed and self.composited is not None:
+            # same layers on the same backdrop, same result as last time
+            numpy.copyto(canvas.data, self.composited)
+            return
+
+        numpy.copyto(canvas.data, self.backdrop)
+        for effect in order:
+            layer = self.layers.get(effect.id)
+            if layer is not None:
+                canvas.composite(layer, effect.blend_mode, effect.opacity)
 
-            if (effect.finished):
-                self.del_effect(effect.id)
+        if self.composited is None:
+            self.composited = numpy.empty_like(canvas.data)
+        numpy.copyto(self.composited, canvas.data)
+        self.layers_changed = False
@@ -23,13 +23,13 @@ class BinDemo(effect.Effect):
         self.speed_increment = .02
 
     def next(self):
-        self.bin.next()
+        self.bin.next(self.dt)
 
         # looper1 will go faster and slower, increasing and decreasing length
         if abs(self.looper1.speed) > 10:
             # flip direction of speed increase
             self.speed_increment *= -1
-        self.looper1.speed += self.speed_increment
+        self.looper1.speed += self.speed_increment * self.steps
         # make the length longer as the speed increases
         # this helps the illusion of speed, since otherwise we skip beads entirely
         # for integer values > 1
@@ -1,4 +1,7 @@
 import copy
+
+import numpy
+
 from mp import color
 from mp.effects import effect
 
@@ -15,6 +18,7 @@ class Bounce(effect.Effect):
 
     # Wish there were a better way than requiring this every time
     dm = copy.deepcopy(effect.Effect.dm)
+    parallel = True
     
     def __init__(self, bead_set, color=color.Color(), speed=1, length=1, **kwargs):
         super().__init__(name="bounce", bead_set=bead_set, color=color, **kwargs)
@@ -28,11 +32,17 @@ class Bounce(effect.Effect):
             self.current = self.length
 
     def next(self):
-        for i in range(0,self.length):
-            self.bead_list[int(round(self.current - i))].color.set(self.color)
-        self.current += self.speed
+        positions = numpy.rint(self.current - numpy.arange(self.length)).astype(numpy.intp)
+        self.blend(self.color, positions)
+        self.current += self.speed * self.steps
         if (self.current >= (len(self.bead_list) - 1) or self.current <= self.length):
             self.speed *= -1
+            # don't overshoot the ends when moving more than a bead per frame
+            self.current = min(max(self.current, self.length), len(self.bead_list) - 1)
+
+    def cache_key(self):
+        # standing still with speed 0
+        return (self.current, self.speed, self.length, self.color.key())
 
     @dm.expose()
     def set_speed(self, speed):
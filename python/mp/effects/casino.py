@@ -1,4 +1,7 @@
 import copy
+
+import numpy
+
 from mp import color
 from mp.effects import effect
 
@@ -13,6 +16,7 @@ class Casino(effect.Effect):
 
     # Wish there were a better way than requiring this every time
     dm = copy.deepcopy(effect.Effect.dm)
+    parallel = True
 
     def __init__(self, bead_set, color=color.Color(), duration=None, speed=1, **kwargs):
         super().__init__(name="casino", bead_set=bead_set, color=color, duration=duration, **kwargs)
@@ -24,21 +28,24 @@ class Casino(effect.Effect):
         else:
             self.current = 0
         self.end_position = len(self.bead_list) - 1
+        # beads moved but not yet shown, when a frame is less than a step
+        self.travel = 0.0
         
 
     def next(self):
 
         # turn on all beads from end_position to end of bead set
-        for b in range(self.end_position, len(self.bead_list)):
-            self.bead_list[b].color.set(self.color)
+        self.blend(self.color, slice(self.end_position, len(self.bead_list)))
         
-        self.current += int(round(self.speed))
+        self.travel += int(round(self.speed)) * self.steps
+        move = int(self.travel)
+        self.travel -= move
+        self.current += move
         if (self.current > self.end_position):
             self.current = self.end_position
         
         # as the speed goes up we "stretch" the bead out
-        for i in range(min(self.current,self.length)):
-            self.bead_list[self.current - i].color.set(self.color)
+        self.blend(self.color, self.current - numpy.arange(min(self.current, self.length)))
 
         #print("self.current", self.current)
         
@@ -48,8 +55,7 @@ class Casino(effect.Effect):
 
         if (self.end_position <= 0):
             # shut off all the beads and start over
-            for b in self.bead_list:
-                b.color.set(self.rosary.bgcolor)
+            self.blend(self.rosary.bgcolor)
             self.end_position = len(self.bead_list) - 1
             self.current = 0
 
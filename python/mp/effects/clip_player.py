@@ -0,0 +1,43 @@
+import copy
+
+from mp import color as _color
+from mp import frame
+from mp.effects import effect
+
+class ClipPlayer(effect.Effect):
+    """
+    ClipPlayer plays a baked mp.clip.Clip back at the clip's frame rate,
+    straight from the memory-mapped file: no per-bead work at all, just a
+    copy and a composite of the whole canvas. It removes itself when the
+    clip is over.
+    """
+
+    # Wish there were a better way than requiring this every time
+    dm = copy.deepcopy(effect.Effect.dm)
+
+    # there's nothing to play without a clip, the Rosary makes these when a
+    # baked trigger is fired (see Rosary.load_clip() and fire_trigger())
+    auto_register = False
+
+    def __init__(self, bead_set=frozenset(), clip=None, color=_color.Color(), **kwargs):
+        # color isn't used, the clip has colors of its own
+        super().__init__(name="clip_player", bead_set=bead_set, color=color, **kwargs)
+        self.clip = clip
+        self.frame = None
+        if clip is not None:
+            self.frame = frame.FrameBuffer(clip.name, clip.bead_count)
+            # clip frames per step
+            self.rate = clip.fps * self.STEP
+            # baked frame 0 is what the effects drew the frame they were
+            # added, i.e. nothing - same as us
+            self.duration = (len(clip) - 1) / self.rate
+
+    def next(self):
+        canvas = self.rosary.canvas
+        if self.clip is None or len(canvas) != self.clip.bead_count:
+            return
+
+        n = int((self.time - self.delay) * self.rate)
+        if n < len(self.clip):
+            self.clip.read_frame(n, self.frame)
+            canvas.composite(self.frame)
@@ -21,7 +21,7 @@ class CopLights(effect.Effect):
 
 
     def next(self):
-        self.bin.next()
+        self.bin.next(self.dt)
 
     @dm.expose()
     def set_direction(self, direction):
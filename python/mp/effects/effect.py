@@ -1,11 +1,103 @@
 import abc
+import collections
 import copy
+import random
 import time
 
-from mp import color
+import numpy
+
+from mp import color, frame
 from mp.dispatcher_mapper import DispatcherMapper
 
 
+# bead index -> position when going around the rosary counter-clockwise
+# (down the stem first, then around the ring the other way)
+CCW_BEAD_MAP = (0, 1, 2, 3, 4,
+                59, 58, 57, 56, 55, 54, 53, 52, 51, 50,
+                49, 48, 47, 46, 45, 44, 43, 42, 41, 40,
+                39, 38, 37, 36, 35, 34, 33, 32, 31, 30,
+                29, 28, 27, 26, 25, 24, 23, 22, 21, 20,
+                19, 18, 17, 16, 15, 14, 13, 12, 11, 10,
+                9, 8, 7, 6, 5)
+
+def ccw_sort_key(bead):
+    # only the rosary beads go around in a circle, leave the rest as they are
+    if bead.frame_buffer.name == 'rosary' and bead.index < len(CCW_BEAD_MAP):
+        return CCW_BEAD_MAP[bead.index]
+    return bead.index
+
+SORT_KEYS = {
+    'cw': lambda bead: bead.index,
+    'ccw': ccw_sort_key,
+}
+
+
+def sorted_bead_set(bead_set, ordering='cw'):
+    """
+    Sort a frozenset of beads ('cw' or 'ccw'), and work out where they live.
+    Returns (beads, frame_buffer, bead_index):
+
+    * beads: the sorted beads, as a tuple
+    * frame_buffer: the FrameBuffer all of the beads live in, or None if they
+                    don't share one
+    * bead_index: read-only array of the frame buffer row of each bead
+
+    Everything returned is immutable so it can be shared, see BeadSetCache.
+    """
+    beads = tuple(sorted(bead_set, key=SORT_KEYS[ordering]))
+    frame_buffer, bead_index = index_beads(beads)
+    bead_index.flags.writeable = False
+    return beads, frame_buffer, bead_index
+
+
+class BeadSetCache:
+    """
+    BeadSetCache keeps the last maxsize results of sorted_bead_set(), since
+    every effect on the same set of beads would otherwise sort it all over
+    again. Each Rosary has one for its own beads (Rosary.bead_sets), so the
+    beads and frame buffers in it go away with the Rosary.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.sets = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self.sets)
+
+    def get(self, bead_set, ordering='cw'):
+        """sorted_bead_set(bead_set, ordering), from the cache if it's there."""
+        key = (bead_set, ordering)
+        result = self.sets.get(key)
+        if result is None:
+            result = sorted_bead_set(bead_set, ordering)
+            self.sets[key] = result
+            if len(self.sets) > self.maxsize:
+                self.sets.popitem(last=False)
+        else:
+            try:
+                self.sets.move_to_end(key)
+            except KeyError:
+                # evicted by another thread in the meantime, no harm done
+                pass
+        return result
+
+    def clear(self):
+        self.sets.clear()
+
+
+def index_beads(beads):
+    """Return (frame_buffer, bead_index) for a sequence of beads, see sorted_bead_set()."""
+    # blend() and fill() can only work in one go if the beads share a frame buffer
+    frame_buffers = set(bead.frame_buffer for bead in beads)
+    if len(frame_buffers) == 1:
+        frame_buffer = frame_buffers.pop()
+    else:
+        frame_buffer = None
+    bead_index = numpy.array([bead.index for bead in beads], dtype=numpy.intp)
+    return frame_buffer, bead_index
+
+
 class Effect(abc.ABC):
     """
     Effect is the base class for all effects. It provides properties and methods
@@ -16,11 +108,31 @@ class Effect(abc.ABC):
     * set_bead_set(): stores a sorted list in bead_set
     * next(): called every mainloop cycle and should be invoked by every Effect's
       own next() method.
+    * blend() and fill(): color beads of bead_list in one batch operation on
+      the frame buffer they live in, rather than one Bead at a time.
     """
 
     # Can't decorate with @self.r, so need this here
     dm = DispatcherMapper()
 
+    # Speeds, steps and durations are given per STEP seconds (the original
+    # frame time, 30 fps). Each frame the Effect is told how many of those
+    # have gone by (steps, see supernext()), and moves on that much
+    STEP = 1 / 30
+
+    # True if the Effect only draws through blend() and fill() (and doesn't
+    # contain other effects), so the Bin can have it draw on its own layer
+    # in another thread, see Bin.set_render_threads()
+    parallel = False
+
+    # False for effects that can't be added by name (/rosary/add_effect),
+    # only made by the Rosary itself (see Rosary.register_written_effects())
+    auto_register = True
+
+    # knobs that aren't turned for all effects at once (/effect/<knob>), only
+    # for one at a time, see Rosary.turn_effect_knob()
+    PER_EFFECT_KNOBS = frozenset(['set_blend_mode', 'set_opacity'])
+
     def __init__(self, *args, **kwargs):
         # id will be assigned when the effect is attached to the mainloop
         self.id = None
@@ -58,10 +170,22 @@ class Effect(abc.ABC):
         self.delay = kwargs.get('delay', 0)
         self.start_time = time.monotonic()
 
-        # For the purposes of `fade_out` and `duration`
+        # For the purposes of `fade_out` and `duration`, in steps
         self.time = 0
+        # how many steps the current frame moves the Effect on
+        self.steps = 1.0
         # the Effect will be removed from effect list if self.finished is true
         self.finished = False
+        # how the Bin composites the Effect's layer onto the ones below it,
+        # see mp.frame.FrameBuffer.composite()
+        self.blend_mode = kwargs.get('blend_mode', 'over')
+        self.opacity = kwargs.get('opacity', 1.0)
+        # the cache_key() the current layer was rendered with, and whether
+        # something happened since that cache_key() doesn't know about
+        self.layer_key = None
+        self.layer_stale = True
+        # the Effect's own random number generator, see the random property
+        self._random = None
         # Since we're not guaranteed a rosary object on init, we will rely
         # on the rosary to look at our exposed methods (via `@dm.expose())
         self.registered = False
@@ -72,55 +196,183 @@ class Effect(abc.ABC):
     def __repr__(self):
         return "<Effect:{}: id={}>".format(self.name, self.id)
         
+    @property
+    def bead_list(self):
+        return self._bead_list
+
+    @bead_list.setter
+    def bead_list(self, beads):
+        self._bead_list = beads
+        # Work out where the beads live (frame buffer row of each bead in
+        # bead_list, in bead_list order) so blend() and fill() can do their job
+        self.frame_buffer, self.bead_index = index_beads(beads)
+
     def set_bead_set(self, set):
         """Convenience function for storing a set of beads as a sorted list."""
-        self.bead_list = self.bead_set_sort(set)
+        ordering = self.bead_set_ordering()
+        if ordering is None:
+            # a custom sort function, can't cache that
+            self.bead_list = self.bead_set_sort(set)
+        else:
+            cache = getattr(self.rosary, 'bead_sets', None)
+            sort = sorted_bead_set if cache is None else cache.get
+            self._bead_list, self.frame_buffer, self.bead_index = \
+                sort(frozenset(set), ordering)
+
+    def bead_set_ordering(self):
+        """Return the name of the ordering bead_set_sort implements ('cw' or
+        'ccw'), or None if it's some other function."""
+        for ordering, sort in self.sort_registry.items():
+            if self.bead_set_sort == sort:
+                return ordering
+        return None
+
+    def blend(self, color, positions=None, alpha=None, intensity=1):
+        """
+        Blend color into the beads of bead_list at positions (all of them if
+        positions is None). positions are indices into bead_list: a slice,
+        a list or an array. color and alpha may be per-bead arrays, see
+        mp.frame.FrameBuffer.blend().
+        """
+        if self.frame_buffer is not None:
+            indices = self.bead_index if positions is None else self.bead_index[positions]
+            self.frame_buffer.blend(color, indices, alpha, intensity)
+            return
+
+        # bead_list spans several frame buffers: do it one bead at a time
+        if positions is None:
+            positions = range(len(self.bead_list))
+        elif isinstance(positions, slice):
+            positions = range(len(self.bead_list))[positions]
+        for i, position in enumerate(positions):
+            c = color
+            if isinstance(color, numpy.ndarray):
+                c = _color_from_row(color[i])
+            a = alpha
+            if numpy.ndim(alpha) > 0:
+                a = alpha[i]
+            self.bead_list[position].color.set(c, intensity, a)
+
+    def fill(self, color, positions=None):
+        """Copy color into the beads of bead_list at positions (all of them if
+        positions is None), replacing whatever was there."""
+        if self.frame_buffer is not None:
+            indices = self.bead_index if positions is None else self.bead_index[positions]
+            self.frame_buffer.fill(color, indices)
+            return
+
+        if positions is None:
+            positions = range(len(self.bead_list))
+        elif isinstance(positions, slice):
+            positions = range(len(self.bead_list))[positions]
+        for position in positions:
+            self.bead_list[position].copy_color(color)
 
     def bead_set_sort_cw(self, set):
-        beads = []
-        for bead in set:
-            beads.append(bead)
-        beads.sort(key=lambda bead: bead.index)
-        return beads
+        return sorted(set, key=SORT_KEYS['cw'])
 
     def bead_set_sort_ccw(self, set):
-        bead_map = [0, 1, 2, 3, 4,
-                    59, 58, 57, 56, 55, 54, 53, 52, 51, 50,
-                    49, 48, 47, 46, 45, 44, 43, 42, 41, 40,
-                    39, 38, 37, 36, 35, 34, 33, 32, 31, 30,
-                    29, 28, 27, 26, 25, 24, 23, 22, 21, 20,
-                    19, 18, 17, 16, 15, 14, 13, 12, 11, 10,
-                    9, 8, 7, 6, 5]
-
-        beads = []
-        for bead in set:
-            beads.append(bead)
-        beads.sort(key=lambda bead: bead_map[bead.index])
-        return beads
+        return sorted(set, key=SORT_KEYS['ccw'])
 
     def get_name(self):
         """Returns the name of the Effect."""
         return self.name
 
-    def supernext(self):
+    def supernext(self, dt=None):
         """
         Invoked for every mainloop cycle.
 
         Having the rosary call this method, and having this method call
         the actual `next()` method lets me make generically implement `delay`
         without forcing every effect to re-implement it.
+
+        dt is the time (in seconds) since the last frame, STEP if None. next()
+        should move the Effect on by self.steps steps (dt / STEP, so 1.0 at
+        30 fps, 0.5 at 60 fps): that way animations run at the same speed
+        whatever the frame rate, and a frame that comes late catches up by
+        itself.
         """
+        self.steps = 1.0 if dt is None else dt / self.STEP
 
         # In refactoring triggers, I wanted an alternate way to "script"
         # sequences - if delay is passed, don't start "nexting" until it's over
         if self.time > self.delay:
-            self.color.next()
+            self.color.next(self.steps)
             self.next()
 
+        self.advance(dt)
+
+    def advance(self, dt=None):
+        """
+        The bookkeeping half of supernext(): count the steps and remove the
+        Effect once its duration is up. The Bin calls just this when it
+        reuses the Effect's layer instead of rendering it again.
+        """
+        self.steps = 1.0 if dt is None else dt / self.STEP
+
         if self.duration is not None and self.time >= self.duration + (self.delay or 0):
             self.my_bin.del_effect(self.id)
 
-        self.time += 1
+        self.time += self.steps
+
+    @property
+    def dt(self):
+        """The time (in seconds) the current frame moves the Effect on, for
+        passing on to the effects it contains."""
+        return self.steps * self.STEP
+
+    def reuse_layer(self):
+        """
+        Return True if rendering the Effect this frame would produce the
+        same layer as last frame, so the Bin can skip rendering it.
+
+        Until the delay is over an Effect draws nothing at all. After that
+        the layer is reused while cache_key() stays the same, unless a knob
+        has been turned (invalidate()) or the color changes by itself.
+        """
+        if self.time <= self.delay:
+            return True
+
+        key = None
+        if not self.layer_stale and not getattr(self.color, 'dynamic', False):
+            key = self.cache_key()
+        reuse = key is not None and key == self.layer_key
+
+        self.layer_key = key
+        self.layer_stale = False
+        return reuse
+
+    def cache_key(self):
+        """
+        Effects whose output (and next state) only depends on a few
+        parameters can return them here, as something hashable. The Effect
+        won't be rendered again until the key changes. None means "always
+        render", which is the default.
+        """
+        return None
+
+    def invalidate(self):
+        """Make sure the Effect is rendered next frame, whatever cache_key() says."""
+        self.layer_stale = True
+
+    @property
+    def random(self):
+        """
+        The Effect's own random.Random. If the rosary has been seeded
+        (Rosary.seed()), it's seeded from that and the Effect's id, so the
+        Effect makes the same choices every run, whatever else is going on
+        (and whichever thread renders it).
+        """
+        if self._random is None:
+            seed = None
+            if self.rosary is not None and self.rosary.random_seed is not None:
+                seed = "{}:{}".format(self.rosary.random_seed, self.id)
+            self._random = random.Random(seed)
+        return self._random
+
+    def reseed(self):
+        """Start over with a generator seeded from the rosary's seed."""
+        self._random = None
 
     def set_rosary(self, rosary):
         self.rosary = rosary
@@ -140,9 +392,25 @@ class Effect(abc.ABC):
     def set_duration(self, sec):
         self.duration = sec
 
+    @dm.expose()
+    def set_blend_mode(self, mode):
+        if mode in frame.BLEND_MODES:
+            self.blend_mode = mode
+
+    @dm.expose()
+    def set_opacity(self, opacity):
+        self.opacity = min(max(float(opacity), 0.0), 1.0)
+
     @dm.expose()
     def fade_out(self, fade_duration):
         self.color = color.ColorFade(self.color, color.Color(0,0,0), fade_duration)
         # Begin countdown to self-destruction
         self.duration = self.delay + self.time + fade_duration
 
+
+def _color_from_row(row):
+    """Make a Color out of one row of a color array, [r, g, b] or [r, g, b, a]."""
+    c = color.Color(row[0], row[1], row[2])
+    if len(row) > 3:
+        c.a = row[3]
+    return c
@@ -19,11 +19,13 @@ class Launcher(effect.Effect):
         self.in_stem = True
 
     def next(self):
+        self.looper.steps = self.steps
         self.looper.next()
         # this operation removes the stem from the set after self.current
         # has exited the stem
+        current = int(round(self.looper.current)) % len(self.bead_list)
         if (self.in_stem and
-            self.bead_list[self.looper.current] not in self.rosary.set_registry['stem']):
+            self.bead_list[current] not in self.rosary.set_registry['stem']):
             self.looper.set_bead_set(self.my_bead_set - self.rosary.set_registry['stem'])
             self.in_stem = False
             self.looper.current = 0
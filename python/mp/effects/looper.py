@@ -1,4 +1,7 @@
 import copy
+
+import numpy
+
 from mp.effects import effect
 from mp import color
 
@@ -9,6 +12,7 @@ class Looper(effect.Effect):
 
     # Wish there were a better way than requiring this every time
     dm = copy.deepcopy(effect.Effect.dm)
+    parallel = True
 
     def __init__(self, bead_set, color=color.Color(), speed=1, length=1, start_offset=0, **kwargs):
         super().__init__(name="looper", bead_set=bead_set, color=color, **kwargs)
@@ -23,11 +27,15 @@ class Looper(effect.Effect):
             self.length = len(self.bead_list)
 
     def next(self):
-        for i in range(0,self.length):
-            self.bead_list[(int(round(self.current)) - i) % len(self.bead_list)].color.set(self.color)
-        self.current += self.speed
+        positions = (int(round(self.current)) - numpy.arange(self.length)) % len(self.bead_list)
+        self.blend(self.color, positions)
+        self.current += self.speed * self.steps
         self.current = self.current % len(self.bead_list)
 
+    def cache_key(self):
+        # standing still with speed 0
+        return (self.current, self.speed, self.length, self.color.key())
+
     @dm.expose()
     def set_speed(self, speed):
         self.speed = speed
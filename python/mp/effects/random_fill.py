@@ -1,7 +1,6 @@
 import copy
 from mp import color
 from mp.effects import effect
-import random
 
 class RandomFill(effect.Effect):
     """
@@ -14,15 +13,16 @@ class RandomFill(effect.Effect):
 
     # Wish there were a better way than requiring this every time
     dm = copy.deepcopy(effect.Effect.dm)
+    parallel = True
 
     def __init__(self, bead_set, color=color.Color(), duration=None, size=1, speed=2, **kwargs):
         super().__init__(name="random_fill", bead_set=bead_set, color=color, duration=duration, **kwargs)
         self.speed = speed
         self.size = size
         self.count = 0
-        self.remaining = set(bead_set)
-        random.seed()
-        self.current = set()
+        # positions in bead_list still to be lit, and already lit
+        self.remaining = list(range(len(self.bead_list)))
+        self.current = []
 
     def next(self):
         super().next()
@@ -31,14 +31,13 @@ class RandomFill(effect.Effect):
             if self.count >= self.speed:
                 self.count = 0
             if self.count == 0:
-                for b in random.sample(self.remaining, self.size):
-                    self.current.add(b)
+                for b in self.random.sample(self.remaining, self.size):
+                    self.current.append(b)
                     self.remaining.remove(b)
 
-        for b in self.current:
-            b.color.set(self.color)
+        self.blend(self.color, self.current)
         
-        self.count += 1
+        self.count += self.steps
 
     @dm.expose()
     def set_size(self, size):
@@ -24,7 +24,15 @@ class Roulette(effect.Effect):
         self.set_speed(0.5)
 
     def next(self):
-        self.bin.next()
+        self.bin.next(self.dt)
+
+    def cache_key(self):
+        # the wheel and the looper stop when the speed knob goes to 0
+        wheel_key = self.wheel.cache_key()
+        looper_key = self.looper.cache_key()
+        if wheel_key is None or looper_key is None:
+            return None
+        return (wheel_key, looper_key)
 
     @dm.expose()
     def set_speed(self, speed):
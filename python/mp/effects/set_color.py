@@ -8,9 +8,13 @@ class SetColor(effect.Effect):
     It removes itself from the mainloop after one invocation of next()
     """
 
+    parallel = True
+
     def __init__(self, bead_set, color=color.Color(), **kwargs):
         super().__init__(name="set_color", bead_set=bead_set, color=color, **kwargs)
 
     def next(self):
-        for bead in (self.bead_list):
-            bead.copy_color(self.color)
+        self.fill(self.color)
+
+    def cache_key(self):
+        return self.color.key()
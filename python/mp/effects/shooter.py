@@ -1,4 +1,7 @@
 import copy
+
+import numpy
+
 from mp import color
 from mp.effects import effect
 
@@ -13,6 +16,7 @@ class Shoot(effect.Effect):
 
     # Wish there were a better way than requiring this every time
     dm = copy.deepcopy(effect.Effect.dm)
+    parallel = True
     
     def __init__(self, bead_set, color=color.Color(), speed=1, length=1, **kwargs):
         super().__init__(name="shooter", bead_set=bead_set, color=color, **kwargs)
@@ -26,9 +30,9 @@ class Shoot(effect.Effect):
             self.current = self.length
 
     def next(self):
-        for i in range(0,self.length):
-            self.bead_list[int(round(self.current - i))].color.set(self.color)
-        self.current += self.speed
+        positions = numpy.rint(self.current - numpy.arange(self.length)).astype(numpy.intp)
+        self.blend(self.color, positions)
+        self.current += self.speed * self.steps
         if (self.current > (len(self.bead_list) - 1) or self.current < self.length):
             self.finished = True
 
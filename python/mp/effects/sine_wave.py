@@ -1,6 +1,8 @@
 import copy
 import math
 
+import numpy
+
 from mp import color
 from mp.effects import effect
 
@@ -16,6 +18,7 @@ class SineWave(effect.Effect):
 
     # Wish there were a better way than requiring this every time
     dm = copy.deepcopy(effect.Effect.dm)
+    parallel = True
 
     def __init__(self, bead_set, color=color.Color(1,1,1), period=1, direction=1, **kwargs):
         super().__init__(name="sine_wave", bead_set=bead_set, color=color, **kwargs)
@@ -25,10 +28,9 @@ class SineWave(effect.Effect):
 
     def next(self):
         
-        for b in (self.bead_list):
-            alpha = (math.sin((2 * math.pi / len(self.bead_list) * self.period) * (b.index + self.offset)) + 1) / 2
-            b.color.set(self.color, alpha=alpha)
-        self.offset = (self.offset) + self.direction % len(self.bead_list)
+        alpha = (numpy.sin((2 * math.pi / len(self.bead_list) * self.period) * (self.bead_index + self.offset)) + 1) / 2
+        self.blend(self.color, alpha=alpha)
+        self.offset = (self.offset) + (self.direction * self.steps) % len(self.bead_list)
 
     @dm.expose()
     def set_offset(self, offset):
@@ -59,6 +61,7 @@ class ThreePhaseSineWave(effect.Effect):
     # Wish there were a better way than requiring this every time
     #dm = DispatcherMapper()
     dm = copy.deepcopy(effect.Effect.dm)
+    parallel = True
 
     def __init__(self, bead_set, color=color.Color(1,1,1), period=1, direction=1, **kwargs):
         super().__init__(name="3phase_sine_wave", bead_set=bead_set, color=color, **kwargs)
@@ -76,11 +79,14 @@ class ThreePhaseSineWave(effect.Effect):
         phase_g = self.phase_g * bead_count
         phase_b = self.phase_b * bead_count
 
-        for bead in (self.bead_list):
-            bead.color.r = ((math.sin((2 * math.pi / bead_count * self.period) * (bead.index + self.offset + phase_r)) + 1) / 2) * self.color.r
-            bead.color.g = ((math.sin((2 * math.pi / bead_count * self.period) * (bead.index + self.offset + phase_g)) + 1) / 2) * self.color.g
-            bead.color.b = ((math.sin((2 * math.pi / bead_count * self.period) * (bead.index + self.offset + phase_b)) + 1) / 2) * self.color.b
-        self.offset = (self.offset) + self.direction % bead_count
+        w = 2 * math.pi / bead_count * self.period
+        x = self.bead_index + self.offset
+        rgb = numpy.empty((bead_count, 3))
+        rgb[:, 0] = ((numpy.sin(w * (x + phase_r)) + 1) / 2) * self.color.r
+        rgb[:, 1] = ((numpy.sin(w * (x + phase_g)) + 1) / 2) * self.color.g
+        rgb[:, 2] = ((numpy.sin(w * (x + phase_b)) + 1) / 2) * self.color.b
+        self.blend(rgb, alpha=1)
+        self.offset = (self.offset) + (self.direction * self.steps) % bead_count
 
     @dm.expose()
     def set_offset(self, offset):
@@ -1,7 +1,6 @@
 import copy
 from mp import color
 from mp.effects import effect
-import random
 
 class Sparkle(effect.Effect):
     """
@@ -14,6 +13,7 @@ class Sparkle(effect.Effect):
 
     # Wish there were a better way than requiring this every time
     dm = copy.deepcopy(effect.Effect.dm)
+    parallel = True
 
     def __init__(self, bead_set, color=color.Color(), duration=None, size=1, speed=2, **kwargs):
         super().__init__(name="sparkle", bead_set=bead_set, color=color, duration=duration, **kwargs)
@@ -21,7 +21,6 @@ class Sparkle(effect.Effect):
         self.size = size
         self.count = 0
         self.bead_set = bead_set  # use a set intead of ordered list
-        random.seed()
 
     def next(self):
         super().next()
@@ -30,12 +29,12 @@ class Sparkle(effect.Effect):
             self.count = 0
 
         if self.count == 0:
-            self.current = random.sample(self.bead_set, self.size)
+            # positions in bead_list
+            self.current = self.random.sample(range(len(self.bead_list)), self.size)
 
-        for b in self.current:
-            b.color.set(self.color)
+        self.blend(self.color, self.current)
         
-        self.count += 1
+        self.count += self.steps
 
     @dm.expose()
     def set_size(self, size):
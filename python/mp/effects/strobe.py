@@ -1,24 +1,39 @@
 import copy
+import math
 from mp import color
 from mp.effects import effect
 
 class Strobe(effect.Effect):
     """
+    Strobe flashes the color on two steps out of every 30 (steps 27 and 30
+    of each cycle), and shows nothing in between. At more than 30 fps a
+    flash lasts several frames; at less, a flash can fall in between two
+    frames and be missed.
+
+    Where the Strobe is in its cycle is worked out from the Effect's time,
+    so the frames in between flashes don't need rendering.
     """
 
+    CYCLE = 30
+    FLASHES = (27, 30)
+
     # Wish there were a better way than requiring this every time
     dm = copy.deepcopy(effect.Effect.dm)
+    parallel = True
 
     def __init__(self, bead_set, color=color.Color(), **kwargs):
         super().__init__(name="strobe", bead_set=bead_set, color=color, **kwargs)
-        self.count = 0
+
+    def count(self):
+        """Which step of the cycle we're on, 1 to CYCLE (0 the very first step)."""
+        step = math.floor(self.time - self.delay - 1)
+        if step <= 0:
+            return 0
+        return ((step - 1) % self.CYCLE) + 1
 
     def next(self):
-        if self.count == 27:
-            for bead in self.bead_list:
-                bead.color.set(self.color)
-        if self.count > 29:
-            for bead in self.bead_list:
-                bead.color.set(self.color)
-            self.count = 0
-        self.count += 1
+        if self.count() in self.FLASHES:
+            self.blend(self.color)
+
+    def cache_key(self):
+        return (self.count() in self.FLASHES, self.color.key())
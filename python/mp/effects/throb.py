@@ -17,6 +17,7 @@ class Throb(effect.Effect):
 
     # Wish there were a better way than requiring this every time
     dm = copy.deepcopy(effect.Effect.dm)
+    parallel = True
 
     def __init__(self, bead_set, color=color.Color(), **kwargs):
         super().__init__(name="throb", bead_set=bead_set, color=color, **kwargs)
@@ -28,9 +29,8 @@ class Throb(effect.Effect):
         super().next()
 
         alpha = (math.sin(self.x * math.pi * self.period) + 1) / 2
-        for bead in (self.bead_list):
-            bead.color.set(self.color, alpha=alpha)
-        self.x += self.step
+        self.blend(self.color, alpha=alpha)
+        self.x += self.step * self.steps
 
     @dm.expose()
     def set_period(self, period):
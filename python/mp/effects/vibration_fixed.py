@@ -1,6 +1,8 @@
 import copy
 import math
 
+import numpy
+
 from mp import color
 from mp.effects import effect
 
@@ -14,9 +16,10 @@ class VibrationFixed(effect.Effect):
 
     # Wish there were a better way than requiring this every time
     dm = copy.deepcopy(effect.Effect.dm)
+    parallel = True
 
     def __init__(self, bead_set, color=color.Color(1,1,1), duration=None, ym=1, k=.25, w=1, **kwargs):
-        super().__init__(name='vibration_fixed', bead_set=bead_set, color=color, duration=duration)
+        super().__init__(name='vibration_fixed', bead_set=bead_set, color=color, duration=duration, **kwargs)
         self.ym = ym
         self.k = k
         self.w = w
@@ -28,15 +31,10 @@ class VibrationFixed(effect.Effect):
     def next(self):
         super().next()
         
-        for b in (self.bead_list):
-            alpha = (((self.ym * math.sin(self.k * b.index - self.w * self.t)) + (self.ym * math.sin(self.k * b.index + self.w * self.t))) + 2) / 4
-            b.color.set(self.color, alpha=alpha)
-            # if self.max < intensity:
-            #     self.max = intensity
-            #     print("max", self.max)
-            # if self.min > intensity:
-            #     self.min = intensity
-            #     print("min", self.min)
-            self.t += 0.01
+        # t advances by 0.01 for every bead along the way
+        t = self.t + (0.01 * numpy.arange(len(self.bead_list)))
+        alpha = (((self.ym * numpy.sin(self.k * self.bead_index - self.w * t)) + (self.ym * numpy.sin(self.k * self.bead_index + self.w * t))) + 2) / 4
+        self.blend(self.color, alpha=alpha)
+        self.t += 0.01 * len(self.bead_list) * self.steps
 
 
@@ -1,4 +1,8 @@
 import copy
+import math
+
+import numpy
+
 from mp.effects import effect
 from mp import color
 
@@ -8,6 +12,7 @@ class Wheel(effect.Effect):
 
     # Wish there were a better way than requiring this every time
     dm = copy.deepcopy(effect.Effect.dm)
+    parallel = True
 
     def __init__(self, bead_set, color=color.Color(), speed=0.5, length=3, start_offset=0, colors=[color.Color(0,0,0), color.Color(1,1,1)], **kwargs):
         super().__init__(name="wheel", bead_set=bead_set, color=color, **kwargs)
@@ -24,21 +29,25 @@ class Wheel(effect.Effect):
 
     def next(self):
         offset = int(round(self.current))
-        color_i = 0
-        color_length = 0
-        for i in range(0,len(self.bead_list)):
-            #print(i, color_i, color_length)
-            self.bead_list[(offset + i) % len(self.bead_list)].color.set(self.colors[color_i])
-            color_length += 1
-            if color_length >= self.length:
-                color_length = 0
-                color_i += 1
-                if color_i >= len(self.colors):
-                    color_i = 0
-
-        self.current += self.speed
+        bead_count = len(self.bead_list)
+        i = numpy.arange(bead_count)
+
+        # each color covers `length` beads, then on to the next color
+        block = max(1, math.ceil(self.length))
+        palette = numpy.array([(c.r, c.g, c.b, c.a) for c in self.colors])
+        colors = palette[(i // block) % len(self.colors)]
+
+        self.blend(colors, (offset + i) % bead_count)
+
+        self.current += self.speed * self.steps
         self.current = self.current % len(self.bead_list)
 
+    def cache_key(self):
+        # standing still with speed 0
+        if any(c.dynamic for c in self.colors):
+            return None
+        return (self.current, self.speed, self.length, tuple(c.key() for c in self.colors))
+
     @dm.expose()
     def set_speed(self, speed):
         self.speed = speed
@@ -0,0 +1,134 @@
+import struct
+
+import numpy
+
+# seconds between the NTP epoch (1900) and the Unix epoch (1970)
+NTP_EPOCH_OFFSET = 2208988800
+# the special OSC timetag meaning "as soon as it arrives"
+IMMEDIATELY = struct.pack('>II', 0, 1)
+
+
+def osc_string(s):
+    """Encode s as an OSC string: null terminated, padded to 4 bytes."""
+    b = s.encode('ascii') + b'\0'
+    return b + b'\0' * (-len(b) % 4)
+
+
+class BeadEncoder:
+    """
+    BeadEncoder builds the /bead OSC message for one class of LEDs:
+
+        /bead ,siib <name> <base> <length> <blob>
+
+    where the blob holds big-endian uint16 [r, g, b, brightness] for each
+    bead. The address, type tag and header bytes are computed once, and
+    every frame only the blob is rewritten in place, straight from a
+    FrameBuffer's data array. encode() allocates nothing per bead and
+    returns a memoryview that can be handed to a socket as-is.
+    """
+
+    ADDRESS = '/bead'
+    TYPETAG = ',siib'
+    BEAD_SIZE = 8  # 4 x uint16
+
+    def __init__(self, name, count):
+        self.name = name
+        self.count = count
+
+        prefix = osc_string(self.ADDRESS) + osc_string(self.TYPETAG) + osc_string(name)
+        # base, length and blob size follow the prefix
+        self.header_offset = len(prefix)
+        self.payload_offset = self.header_offset + struct.calcsize('!iii')
+
+        self.buffer = bytearray(self.payload_offset + (count * self.BEAD_SIZE))
+        self.buffer[:self.header_offset] = prefix
+        struct.pack_into('!iii', self.buffer, self.header_offset,
+                         0,                           # base
+                         count,                       # length
+                         count * self.BEAD_SIZE)      # blob size
+        self.message = memoryview(self.buffer)
+
+        # a second buffer with the same prefix, for messages that only
+        # carry part of the frame (see message_range())
+        self.range_buffer = bytearray(self.buffer)
+        self.range_message = memoryview(self.range_buffer)
+
+        # a (count, 4) view of the blob, written to directly by encode()
+        self.payload = numpy.frombuffer(self.buffer, dtype='>u2',
+                                        offset=self.payload_offset,
+                                        count=count * 4).reshape(count, 4)
+        self.scratch = numpy.empty((count, 3))
+
+    def encode(self, data):
+        """Encode a FrameBuffer data array into the message buffer and return
+        the message as a memoryview."""
+        numpy.multiply(data[:, 0:3], 0xffff, out=self.scratch)
+        numpy.clip(self.scratch, 0, 0xffff, out=self.scratch)
+        # assigning floats to the uint16 view truncates, just like int() did
+        self.payload[:, 0:3] = self.scratch
+        self.payload[:, 3] = data[:, 4]
+        return self.message
+
+    def message_range(self, base, length):
+        """Return a /bead message carrying only beads base..base+length-1 of
+        the last encode()d frame. The memoryview is only valid until the next
+        call, so send it right away."""
+        if base == 0 and length == self.count:
+            return self.message
+
+        size = length * self.BEAD_SIZE
+        start = self.payload_offset + (base * self.BEAD_SIZE)
+        struct.pack_into('!iii', self.range_buffer, self.header_offset,
+                         base, length, size)
+        self.range_message[self.payload_offset:self.payload_offset + size] = \
+            self.message[start:start + size]
+        return self.range_message[:self.payload_offset + size]
+
+
+def ntp_timetag(t):
+    """Encode a time.time() style timestamp as an OSC (NTP) timetag."""
+    seconds = int(t)
+    fraction = int((t - seconds) * (1 << 32))
+    return struct.pack('>II', seconds + NTP_EPOCH_OFFSET, fraction)
+
+
+class BundleEncoder:
+    """
+    BundleEncoder packs already encoded OSC messages into one OSC bundle:
+
+        #bundle <timetag> (<size> <message>)...
+
+    The buffer is reused from one bundle to the next. Use it like this:
+
+        bundle.begin()
+        bundle.add(message)
+        ...
+        sink.send(bundle.end(time.time() + latency))
+    """
+
+    HEADER = osc_string('#bundle')
+    TIMETAG_OFFSET = len(HEADER)
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.count = 0
+        self.begin()
+
+    def begin(self):
+        """Start a new, empty bundle."""
+        self.buffer[:] = self.HEADER + IMMEDIATELY
+        self.count = 0
+
+    def add(self, message):
+        """Append an encoded message (copying it)."""
+        self.buffer += struct.pack('>i', len(message))
+        self.buffer += message
+        self.count += 1
+
+    def end(self, t=None):
+        """Timetag the bundle to be presented at time t (a time.time()
+        timestamp), or as soon as it arrives if t is None, and return it.
+        It's only valid until the next begin()."""
+        self.buffer[self.TIMETAG_OFFSET:self.TIMETAG_OFFSET + 8] = \
+            IMMEDIATELY if t is None else ntp_timetag(t)
+        return self.buffer
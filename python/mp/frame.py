@@ -0,0 +1,222 @@
+import numpy
+
+from mp import color
+
+
+# How a layer's color (src) is combined with the color underneath it (dst)
+# where both are opaque, see FrameBuffer.composite().
+BLEND_MODES = {
+    'over': lambda dst, src: src,
+    'add': lambda dst, src: numpy.minimum(dst + src, 1.0),
+    'max': numpy.maximum,
+    'multiply': numpy.multiply,
+}
+
+
+class FrameBuffer:
+    """
+    FrameBuffer holds the colors of one class of LEDs (rosary, base or
+    cross) in a single contiguous array, one row per bead:
+
+        [r, g, b, a, brightness]
+
+    Beads are lightweight views over one row of the array, so effects that
+    set bead colors one at a time keep working, while whole-frame operations
+    (clearing, compositing, encoding) can work on the array in one go.
+    """
+
+    R = 0
+    G = 1
+    B = 2
+    A = 3
+    BRIGHTNESS = 4
+    CHANNELS = 5
+
+    def __init__(self, name='', count=0, data=None):
+        self.name = name
+        # NOTE: Bead views hold on to rows of this array, so never
+        # replace it - always write into it
+        if data is None:
+            data = numpy.zeros((count, self.CHANNELS))
+            data[:, self.BRIGHTNESS] = 0xff
+        self.data = data
+        # set on views: the FrameBuffer this is a view of, and where in it
+        # the view starts
+        self.parent = None
+        self.offset = 0
+
+    def view(self, name, start, count):
+        """Return a FrameBuffer for rows start..start+count-1 of this one,
+        sharing its data."""
+        view = FrameBuffer(name, data=self.data[start:start + count])
+        view.parent = self
+        view.offset = start
+        return view
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return "FrameBuffer(name={}, count={})".format(self.name, len(self))
+
+    def fill(self, color, indices=None):
+        """Copy the r, g, b, a and brightness values of a Color into every row,
+        or just the rows listed in indices."""
+        if indices is None:
+            indices = slice(None)
+        self.data[indices, self.R] = color.r
+        self.data[indices, self.G] = color.g
+        self.data[indices, self.B] = color.b
+        self.data[indices, self.A] = color.a
+        self.data[indices, self.BRIGHTNESS] = color.brightness
+
+    def clear(self, color):
+        """Blend a (background) Color into the whole frame. This is the
+        whole-array equivalent of calling Color.set(color) on every bead."""
+        self.blend(color)
+
+    def clear_transparent(self):
+        """Make every row fully transparent (black, alpha 0, full brightness)."""
+        self.data[:, self.R:self.BRIGHTNESS] = 0
+        self.data[:, self.BRIGHTNESS] = 0xff
+
+    def composite(self, layer, mode='over', opacity=1.0):
+        """
+        Composite another FrameBuffer of the same size on top of this one.
+
+        mode is one of BLEND_MODES. Where the layer is partly transparent the
+        result is mixed with what's underneath using the Porter and Duff
+        "over" equation (so 'over' is plain alpha compositing), and opacity
+        scales the alpha of the whole layer. Brightness is taken from the
+        layer wherever it has any color.
+        """
+        alpha = layer.data[:, self.A]
+        if not alpha.any():
+            # nothing to see here
+            return
+
+        opaque = alpha == 1
+        if mode == 'over' and opacity == 1 and numpy.count_nonzero(opaque) == numpy.count_nonzero(alpha):
+            # the usual case: every bead the layer has drawn is opaque
+            numpy.copyto(self.data, layer.data, where=opaque[:, None])
+            return
+
+        # channel-major copies: numpy is a lot quicker on those than on
+        # the (n, 3) column slices of the row-major frame data
+        src = numpy.ascontiguousarray(layer.data.T)
+        dst = numpy.ascontiguousarray(self.data.T)
+        src_a = src[self.A]
+        if opacity != 1:
+            src_a = src_a * opacity
+        src_rgb = src[self.R:self.A]
+        dst_rgb = dst[self.R:self.A]
+
+        if mode != 'over':
+            # where there's nothing underneath the layer's own color shows
+            mixed = BLEND_MODES[mode](dst_rgb, src_rgb)
+            mixed -= src_rgb
+            mixed *= dst[self.A]
+            src_rgb = src_rgb + mixed
+
+        # how much of what's underneath shows through
+        weight = dst[self.A] * (1 - src_a)
+        a = src_a + weight
+        # where a is 0 so are src_a and weight, avoid dividing 0 by 0
+        divisor = a + (a == 0)
+        rgb = src_rgb * (src_a / divisor)
+        rgb += dst_rgb * (weight / divisor)
+
+        self.data[:, self.R:self.A] = rgb.T
+        self.data[:, self.A] = a
+        numpy.copyto(self.data[:, self.BRIGHTNESS], src[self.BRIGHTNESS], where=src_a > 0)
+
+    def blend(self, color, indices=None, alpha=None, intensity=1):
+        """
+        Blend color into the rows listed in indices (every row if None) using
+        the Porter and Duff "over" equation - the batch version of Color.set().
+
+        * color: a Color, or an array of per-row colors shaped (n, 3) [r, g, b]
+                 or (n, 4) [r, g, b, a]
+        * indices: anything numpy can index rows with: None, a slice, or an
+                   array of row numbers (repeats are blended once)
+        * alpha: a scalar or an array of n per-row alphas. If None, alpha is
+                 taken from the color (or 1 for (n, 3) color arrays)
+        * intensity: scales the blended result, like Color.set()
+        """
+        if indices is None:
+            indices = slice(None)
+
+        if isinstance(color, numpy.ndarray):
+            src = color[..., self.R:self.A]
+            if alpha is None:
+                alpha = color[..., self.A] if color.shape[-1] > self.A else 1.0
+        else:
+            src = numpy.array((color.r, color.g, color.b))
+            if alpha is None:
+                alpha = color.a
+
+        if numpy.ndim(alpha) == 0:
+            if alpha == 0:
+                if intensity != 1:
+                    self.data[indices, self.R:self.A] *= intensity
+                return
+            if alpha == 1:
+                # opaque, no need to look at what's underneath
+                self.data[indices, self.R:self.A] = src * intensity
+                self.data[indices, self.A] = 1.0
+                return
+
+        alpha = numpy.asarray(alpha, dtype=float)
+        dst_a = self.data[indices, self.A]
+        a = alpha + (dst_a * (1 - alpha))
+        # how much of the existing color shows through
+        weight = dst_a * (1 - alpha)
+        rgb = (src * alpha[..., None]) + (self.data[indices, self.R:self.A] * weight[..., None])
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            rgb /= a[..., None]
+        rgb[a == 0] = 0
+        if intensity != 1:
+            rgb *= intensity
+
+        self.data[indices, self.R:self.A] = rgb
+        self.data[indices, self.A] = a
+
+
+def _channel(column):
+    """Build a property that reads and writes one column of a BeadColor's row."""
+
+    def get(self):
+        return self.row.item(column)
+
+    def set(self, value):
+        self.row[column] = value
+
+    return property(get, set)
+
+
+class BeadColor(color.Color):
+    """
+    BeadColor is the Color of a Bead. Rather than holding its own r, g, b and
+    a values it reads and writes one row of a FrameBuffer.
+    """
+
+    r = _channel(FrameBuffer.R)
+    g = _channel(FrameBuffer.G)
+    b = _channel(FrameBuffer.B)
+    a = _channel(FrameBuffer.A)
+    brightness = _channel(FrameBuffer.BRIGHTNESS)
+
+    def __init__(self, frame_buffer, index, name='bead_color'):
+        # don't call Color.__init__(), it would overwrite the row
+        self.row = frame_buffer.data[index]
+        self.name = name
+
+    def __copy__(self):
+        # a copy is a snapshot, not another view of the same row
+        c = color.Color(self.r, self.g, self.b, self.a)
+        c.brightness = self.brightness
+        return c
+
+    def copy(self, color):
+        """Copy the r, g, b, a and brightness values of a Color into the row."""
+        self.row[:] = (color.r, color.g, color.b, color.a, color.brightness)
@@ -0,0 +1,151 @@
+import threading
+
+import numpy
+
+from mp import frame
+
+
+class FrameInterpolator:
+    """
+    FrameInterpolator sends frames factor times as often as they're rendered.
+    Effects render at the base rate as usual, and push() hands each frame
+    over. A thread of its own then sends factor frames, evenly spread over
+    the next frame_time, blending linearly from what's on the LEDs to the
+    new frame. The last of them is the new frame itself.
+
+    Moving beads (looper, bounce, wheel at high speed) then glide instead
+    of jumping a bead or two every 1/30 s. The cost is a few numpy
+    operations and an encode per extra frame, far less than rendering
+    factor times as many frames. In exchange, frames show up one frame
+    later than they otherwise would.
+
+    If a frame is pushed before the previous one has been fully sent (e.g.
+    the frame rate went up), the blend starts over from whatever was sent
+    last, so there are no jumps either way.
+
+    The rosary's updaters send from a canvas of their own while the
+    interpolator runs, like with mp.pipeline.FramePipeline. Frames go out
+    through Rosary.transmit_frame(), under the rosary's send_lock, so OSC
+    calls that change the sink can't get in the middle of one. If the
+    thread dies (e.g. the sink raises), push() raises its exception on the
+    render thread.
+    """
+
+    def __init__(self, rosary, factor=4):
+        self.rosary = rosary
+        self.factor = factor
+        canvas = rosary.canvas
+        shape = canvas.data.shape
+        # the latest frame pushed, and the two being blended
+        self.next = numpy.empty(shape)
+        self.previous = numpy.empty(shape)
+        self.current = numpy.empty(shape)
+        self.delta = numpy.empty(shape)
+        self.output = frame.FrameBuffer('interpolated', len(canvas))
+        numpy.copyto(self.output.data, canvas.data)
+
+        self.pushed = 0
+        self.blended = 0
+        self.sent = 0
+        # blends cut short by a newer frame
+        self.interrupted = 0
+        self.push_time = 0.0
+        self.frame_time = rosary.frame_time
+        self.running = False
+        self.ready = threading.Condition()
+        # what the thread died of, if it did
+        self.error = None
+        self.thread = None
+        self.frame_buffers = []
+
+    def summary(self):
+        return {
+            'factor': self.factor,
+            'pushed': self.pushed,
+            'sent': self.sent,
+            'interrupted': self.interrupted,
+        }
+
+    def start(self):
+        r = self.rosary
+        self.frame_buffers = [updater.frame_buffer for updater in r.updater_list]
+        for updater in r.updater_list:
+            fb = updater.frame_buffer
+            updater.frame_buffer = self.output.view(fb.name, fb.offset, len(fb))
+
+        self.running = True
+        self.thread = threading.Thread(name='interpolate', target=self.run_thread, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.ready:
+            self.running = False
+            self.ready.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        for updater, fb in zip(self.rosary.updater_list, self.frame_buffers):
+            updater.frame_buffer = fb
+
+    def push(self, data, frame_time=None):
+        """Hand over a rendered frame (a canvas' data), due now. The next one
+        is due in frame_time (the rosary's frame_time if None)."""
+        r = self.rosary
+        if self.error is not None:
+            raise RuntimeError("the interpolator failed") from self.error
+        with self.ready:
+            numpy.copyto(self.next, data)
+            self.push_time = r.pacer.clock()
+            self.frame_time = r.frame_time if frame_time is None else frame_time
+            self.factor = max(1, int(r.interpolation))
+            self.pushed += 1
+            self.ready.notify_all()
+
+    def blend(self, fraction):
+        """Set the output to previous + fraction * (current - previous)."""
+        out = self.output.data
+        numpy.multiply(self.delta, fraction, out=out)
+        numpy.add(out, self.previous, out=out)
+
+    def run_thread(self):
+        try:
+            self.run()
+        except BaseException as e:
+            self.error = e
+
+    def run(self):
+        r = self.rosary
+        clock = r.pacer.clock
+        sleep = r.pacer.sleep
+        out = self.output.data
+
+        while True:
+            with self.ready:
+                while self.running and self.blended == self.pushed:
+                    self.ready.wait()
+                if not self.running:
+                    return
+                self.blended = self.pushed
+                # blend from what's on the LEDs now to the new frame
+                numpy.copyto(self.previous, out)
+                numpy.copyto(self.current, self.next)
+                start = self.push_time
+                factor = self.factor
+                step_time = self.frame_time / factor
+
+            numpy.subtract(self.current, self.previous, out=self.delta)
+            for i in range(1, factor + 1):
+                if i > 1:
+                    delay = start + ((i - 1) * step_time) - clock()
+                    if delay > 0:
+                        sleep(delay)
+                    if not self.running or self.blended != self.pushed:
+                        self.interrupted += 1
+                        break
+
+                if i == factor:
+                    numpy.copyto(out, self.current)
+                else:
+                    self.blend(i / factor)
+                r.transmit_frame()
+                self.sent += 1
@@ -0,0 +1,76 @@
+import socket
+import time
+
+from mp import encoder
+
+
+class UDPSink:
+    """
+    UDPSink sends encoded OSC packets to oscled (or one of the simulators).
+
+    Packets are handed to the socket as they are: anything that supports
+    the buffer protocol (bytes, bytearray, memoryview) will do.
+
+    Every sink also has end_frame(), called once all the packets of a frame
+    have been sent.
+    """
+
+    def __init__(self, ip="127.0.0.1", port=5005):
+        # same socket setup as pythonosc's UDPClient
+        for addr in socket.getaddrinfo(ip, port, type=socket.SOCK_DGRAM):
+            af, socktype, protocol, canonname, sa = addr
+            try:
+                self.sock = socket.socket(af, socktype)
+            except OSError:
+                continue
+            break
+
+        self.sock.setblocking(False)
+        self.address = (ip, port)
+
+    def send(self, payload):
+        self.sock.sendto(payload, self.address)
+
+    def end_frame(self):
+        pass
+
+
+class NullSink:
+    """NullSink throws every packet away. Handy for running headless."""
+
+    def send(self, payload):
+        pass
+
+    def end_frame(self):
+        pass
+
+
+class BundleSink:
+    """
+    BundleSink collects the packets of a frame and hands them to another
+    sink as a single OSC bundle when the frame is over (end_frame()).
+
+    One datagram per frame instead of one per class of LEDs, and the
+    receiver gets the whole frame at once, so it can show it in one go.
+    The bundle is timetagged latency seconds into the future (if latency is
+    0, it's shown as soon as it arrives), so several receivers with synced
+    clocks present the frame at the same moment.
+    """
+
+    def __init__(self, sink, latency=0.0, clock=time.time):
+        self.sink = sink
+        self.latency = latency
+        self.clock = clock
+        self.bundle = encoder.BundleEncoder()
+
+    def send(self, payload):
+        # payloads are often views into buffers that get reused, add()
+        # copies them, which is what we want
+        self.bundle.add(payload)
+
+    def end_frame(self):
+        if self.bundle.count:
+            t = self.clock() + self.latency if self.latency else None
+            self.sink.send(self.bundle.end(t))
+            self.bundle.begin()
+        self.sink.end_frame()
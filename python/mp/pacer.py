@@ -0,0 +1,251 @@
+import collections
+import time
+
+
+def percentile(values, p):
+    """Return the p-th percentile (0-100) of values, nearest rank."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = int(round((p / 100) * (len(ordered) - 1)))
+    return ordered[rank]
+
+
+class FrameStats:
+    """
+    Rolling statistics about the last `window` frames:
+
+    * jitter: how late (in seconds) each frame went out relative to its deadline
+    * render: how long (in seconds) it took to render each frame
+    * drops: frame slots that were skipped because rendering fell behind
+    * late: frames that missed their deadline
+    """
+
+    def __init__(self, window=300):
+        self.jitter = collections.deque(maxlen=window)
+        self.render = collections.deque(maxlen=window)
+        self.frames = 0
+        self.drops = 0
+        self.late = 0
+
+    def reset(self):
+        self.jitter.clear()
+        self.render.clear()
+        self.frames = 0
+        self.drops = 0
+        self.late = 0
+
+    def summary(self):
+        """Return the statistics as a dict, times in microseconds."""
+        def us(values, fn):
+            return round(fn(values) * 1e6, 1) if values else 0.0
+
+        jitter = list(self.jitter)
+        render = list(self.render)
+        return {
+            'frames': self.frames,
+            'drops': self.drops,
+            'late': self.late,
+            'jitter_mean_us': us(jitter, lambda v: sum(v) / len(v)),
+            'jitter_p99_us': us(jitter, lambda v: percentile(v, 99)),
+            'jitter_max_us': us(jitter, max),
+            'render_mean_us': us(render, lambda v: sum(v) / len(v)),
+            'render_p99_us': us(render, lambda v: percentile(v, 99)),
+            'render_max_us': us(render, max),
+        }
+
+
+class FramePacer:
+    """
+    FramePacer decides when frames go out. The mainloop uses it like this:
+
+        pacer.start()
+        catchup = 0
+        while running:
+            pacer.frame_started()
+            render(dt=frame_time * (1 + catchup))
+            # missed frames, made up for by moving the next one on further
+            catchup = pacer.frame_rendered()
+            pacer.wait()
+            transmit()
+
+    Callers that can't block (e.g. an asyncio loop) can do their own
+    waiting instead of calling wait(): sleep for time_left() seconds, then
+    call frame_due().
+
+    knobs:
+    * frame_time: seconds per frame (reciprocal of fps)
+    * policy: what to do when rendering a frame overruns its deadline
+        - 'skip': drop the missed frame slots, stay on the frame grid
+        - 'catchup': make up for up to max_catchup missed frames (the next
+                     frame moves the animation on that much further) so it
+                     keeps up, drop any slots beyond that
+        - 'slowmo': drop nothing, restart the frame grid from now (the
+                    animation runs slower while the host is overloaded)
+    * max_catchup: upper bound on missed frames made up for per frame
+    * spin: wait() sleeps until this many seconds before the deadline, then
+            busy-waits for the rest. 0 means just sleep.
+    """
+
+    POLICIES = ('skip', 'catchup', 'slowmo')
+
+    def __init__(self, frame_time=1/30, policy='catchup', max_catchup=2, spin=0.002,
+                 window=300, clock=time.perf_counter, sleep=time.sleep):
+        self.frame_time = frame_time
+        self.set_policy(policy)
+        self.max_catchup = max_catchup
+        self.spin = spin
+        self.clock = clock
+        self.sleep = sleep
+        self.stats = FrameStats(window)
+        self.deadline = None
+        self.render_start = None
+
+    def set_policy(self, policy):
+        if policy not in self.POLICIES:
+            raise ValueError("unknown pacing policy {}, expected one of {}".format(policy, self.POLICIES))
+        self.policy = policy
+
+    def start(self):
+        """(Re)start the frame grid: the first frame is due one frame_time from now."""
+        self.deadline = self.clock() + self.frame_time
+
+    def frame_started(self):
+        self.render_start = self.clock()
+
+    def frame_rendered(self):
+        """
+        Record the render time, and work out what to do if we've already
+        overrun the deadline. Returns the number of missed frames the caller
+        should make up for (see the class docstring).
+        """
+        now = self.clock()
+        self.stats.render.append(now - self.render_start)
+
+        if now <= self.deadline:
+            return 0
+
+        self.stats.late += 1
+        if self.policy == 'slowmo':
+            # send this frame as soon as possible and carry on from there
+            self.deadline = now
+            return 0
+
+        # number of whole frame slots that have gone by
+        missed = int((now - self.deadline) / self.frame_time) + 1
+        self.deadline += missed * self.frame_time
+        self.stats.drops += missed
+
+        if self.policy == 'catchup':
+            return min(missed, self.max_catchup)
+        return 0
+
+    def time_left(self):
+        """Seconds until the current deadline, 0 if it has passed already."""
+        return max(0.0, self.deadline - self.clock())
+
+    def frame_due(self):
+        """Record how late the frame is going out, and move on to the next deadline."""
+        self.stats.jitter.append(self.clock() - self.deadline)
+        self.stats.frames += 1
+        self.deadline += self.frame_time
+
+    def wait(self):
+        """Sleep (then spin) until the current deadline, then move on to the next one."""
+        remaining = self.time_left()
+        if remaining > self.spin:
+            self.sleep(remaining - self.spin)
+        if self.spin:
+            while self.clock() < self.deadline:
+                pass
+
+        self.frame_due()
+
+
+class FrameRateGovernor:
+    """
+    FrameRateGovernor picks the frame rate from a ladder of rates (e.g. 30,
+    24, 20 fps), watching how long frames take to render and how many go out
+    late. It's fed every frame (update()) and decides once every window
+    frames:
+
+    * saturated: the 90th percentile render time is over high (a fraction
+      of the frame time), or late_limit or more frames were late - step
+      down a rate right away
+    * headroom: the 90th percentile render time would be under low at the
+      next rate up, and no frame was late - step up, but only after
+      up_windows windows like that in a row
+
+    The gap between high and low, and waiting for several good windows
+    before going up, keep it from flip-flopping between two rates. Effects
+    move on by elapsed time, so a lower rate looks smoother than dropped
+    frames do, the animation doesn't slow down.
+    """
+
+    def __init__(self, rates=(30, 24, 20), high=0.9, low=0.6, window=30,
+                 late_limit=2, up_windows=3):
+        self.rates = sorted(rates, reverse=True)
+        self.high = high
+        self.low = low
+        self.window = window
+        self.late_limit = late_limit
+        self.up_windows = up_windows
+
+        self.render = []
+        self.late = 0
+        self.good_windows = 0
+        self.frames = 0
+        self.load = 0.0
+        # the latest decisions, for stats
+        self.decisions = collections.deque(maxlen=20)
+
+    def update(self, render_time, late, fps):
+        """
+        Record a frame that took render_time seconds to render (late if it
+        missed its deadline) at fps. Returns the rate to switch to, or None
+        to stay put.
+        """
+        self.frames += 1
+        self.render.append(render_time)
+        if late:
+            self.late += 1
+        if len(self.render) < self.window:
+            return None
+
+        cost = percentile(self.render, 90)
+        late = self.late
+        self.render = []
+        self.late = 0
+        self.load = cost * fps
+
+        # where we are on the ladder: the highest rate not above fps
+        lower = [rate for rate in self.rates if rate < fps]
+        higher = [rate for rate in self.rates if rate > fps]
+
+        if self.load > self.high or late >= self.late_limit:
+            self.good_windows = 0
+            if lower:
+                return self.decide(fps, lower[0],
+                                   "{} late, load {:.2f}".format(late, self.load))
+            return None
+
+        if higher and late == 0 and cost * higher[-1] < self.low:
+            self.good_windows += 1
+            if self.good_windows >= self.up_windows:
+                self.good_windows = 0
+                return self.decide(fps, higher[-1],
+                                   "load {:.2f} at {} fps".format(cost * higher[-1], higher[-1]))
+        else:
+            self.good_windows = 0
+        return None
+
+    def decide(self, fps, rate, reason):
+        self.decisions.append({'frame': self.frames, 'from': fps, 'to': rate, 'reason': reason})
+        return rate
+
+    def summary(self):
+        return {
+            'rates': self.rates,
+            'load': round(self.load, 3),
+            'decisions': list(self.decisions),
+        }
@@ -0,0 +1,153 @@
+import threading
+
+import numpy
+
+from mp import frame
+
+
+class FramePipeline:
+    """
+    FramePipeline splits the mainloop in two stages, so how long a frame
+    takes to render no longer decides when it goes out:
+
+    * render (run(), on the calling thread): applies the queued OSC calls,
+      renders frames as fast as it can into a preallocated ring of depth
+      frame buffers, and waits whenever the ring is full
+    * transmit (a thread of its own): sends the oldest rendered frame at
+      each deadline of the rosary's pacer (see mp.pacer.FramePacer.wait()).
+      If no frame is ready (an underrun) the last one is sent again and the
+      frame goes out at the next deadline instead.
+
+    The price is latency: an OSC call shows up on the LEDs at most depth
+    frames later than it would otherwise.
+
+    If the transmit stage dies (e.g. the sink raises), its exception is
+    raised again on the render stage, which would otherwise wait forever.
+
+    Underruns are counted as late frames in the pacer's statistics, render
+    times and jitter go there too, so Rosary.frame_stats() works as usual.
+    """
+
+    def __init__(self, rosary, depth=3):
+        self.rosary = rosary
+        self.depth = depth
+        canvas = rosary.canvas
+        self.ring = numpy.empty((depth,) + canvas.data.shape)
+        # frames rendered into the ring, and frames taken out of it, so far
+        self.rendered = 0
+        self.sent = 0
+        self.underruns = 0
+        self.ready = threading.Condition()
+        # what the transmit stage died of, if it did
+        self.error = None
+
+        # the updaters send from a canvas of their own, the render stage is
+        # busy with the rosary's
+        self.transmit_canvas = frame.FrameBuffer('transmit', len(canvas))
+        numpy.copyto(self.transmit_canvas.data, canvas.data)
+        self.frame_buffers = [updater.frame_buffer for updater in rosary.updater_list]
+        self.transmit_thread = None
+
+    def summary(self):
+        with self.ready:
+            queued = self.rendered - self.sent
+        return {
+            'depth': self.depth,
+            'queued': queued,
+            'rendered': self.rendered,
+            'sent': self.sent,
+            'underruns': self.underruns,
+        }
+
+    def run(self):
+        """Run both stages until the rosary's mainloop is stopped."""
+        r = self.rosary
+        for updater in r.updater_list:
+            fb = updater.frame_buffer
+            updater.frame_buffer = self.transmit_canvas.view(fb.name, fb.offset, len(fb))
+
+        self.transmit_thread = threading.Thread(name='transmit', target=self.run_transmit)
+        self.transmit_thread.start()
+        try:
+            self.render()
+        finally:
+            with self.ready:
+                r.run_mainloop = False
+                self.ready.notify_all()
+            self.transmit_thread.join()
+            for updater, fb in zip(r.updater_list, self.frame_buffers):
+                updater.frame_buffer = fb
+
+    def check_transmit(self):
+        """Raise what the transmit stage died of, if it did."""
+        if self.error is not None:
+            raise RuntimeError("the transmit stage failed") from self.error
+        if not self.transmit_thread.is_alive():
+            raise RuntimeError("the transmit stage is gone")
+
+    def render(self):
+        r = self.rosary
+        stats = r.pacer.stats
+        clock = r.pacer.clock
+        underruns = 0
+
+        while r.run_mainloop:
+            with self.ready:
+                while r.run_mainloop and self.rendered - self.sent >= self.depth:
+                    self.check_transmit()
+                    self.ready.wait(0.5)
+                if not r.run_mainloop:
+                    return
+
+            start = clock()
+            if r.bin.profiler is not None:
+                r.bin.profiler.budget = r.frame_time
+            r.apply_commands()
+            r.render_frame()
+            # only the transmit stage touches frames in the ring that
+            # have been rendered, so this can be done without the lock
+            numpy.copyto(self.ring[self.rendered % self.depth], r.canvas.data)
+            render_time = clock() - start
+            stats.render.append(render_time)
+            # an underrun since the last frame means we're not keeping up
+            r.govern(render_time, self.underruns > underruns)
+            underruns = self.underruns
+
+            with self.ready:
+                self.rendered += 1
+                self.ready.notify_all()
+
+    def run_transmit(self):
+        try:
+            self.transmit()
+        except BaseException as e:
+            with self.ready:
+                self.error = e
+                self.ready.notify_all()
+
+    def transmit(self):
+        r = self.rosary
+        frame_pacer = r.pacer
+        frame_pacer.frame_time = r.frame_time
+
+        # don't start the clock until there's something to send
+        with self.ready:
+            while r.run_mainloop and self.rendered == 0:
+                self.ready.wait()
+        frame_pacer.start()
+
+        while r.run_mainloop:
+            frame_pacer.frame_time = r.frame_time
+            frame_pacer.wait()
+
+            with self.ready:
+                if self.rendered > self.sent:
+                    numpy.copyto(self.transmit_canvas.data, self.ring[self.sent % self.depth])
+                    self.sent += 1
+                    self.ready.notify_all()
+                else:
+                    # nothing new, send the last frame again
+                    self.underruns += 1
+                    frame_pacer.stats.late += 1
+
+            r.transmit_frame()
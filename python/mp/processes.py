@@ -0,0 +1,254 @@
+import multiprocessing
+import queue
+import threading
+import traceback
+
+from multiprocessing import shared_memory
+
+import numpy
+
+from mp import frame, output, rosary
+
+
+# OSC calls that change how frames are sent rather than what's in them:
+# these go to the sender process as well as the renderer. Only the
+# /<namespace>/<fn> part of a path counts, the rest is kwargs
+SENDER_PATHS = frozenset([
+    '/rosary/set_bundling',
+    '/rosary/set_interpolation',
+    '/rosary/set_output_mode',
+    '/rosary/set_recording',
+])
+
+
+class FrameChannel:
+    """
+    FrameChannel hands finished frames from one process to another through
+    multiprocessing.shared_memory, without copying them through a pipe.
+
+    There are two slots (double buffering), each guarded by a sequence
+    number that's odd while the slot is being written (a seqlock): the
+    reader copies the latest frame out and tries again if the writer got to
+    the slot in the meantime. The writer never waits for the reader.
+
+    Each frame goes with the frame_time it was rendered at, so the reader
+    knows when the next one is due (e.g. for interpolation) whatever the
+    writer's frame rate is set to or governed down to.
+
+    One process creates the channel (create=True), the other attaches to it
+    by name.
+    """
+
+    SLOTS = 2
+    # header: the sequence number of each slot, then the latest frame number
+    HEADER = SLOTS + 1
+
+    def __init__(self, shape, name=None, create=False):
+        self.shape = tuple(shape)
+        frame_size = int(numpy.prod(self.shape))
+        size = (self.HEADER + self.SLOTS + (self.SLOTS * frame_size)) * 8
+        self.memory = shared_memory.SharedMemory(name=name, create=create, size=size)
+        self.name = self.memory.name
+
+        self.header = numpy.ndarray((self.HEADER,), dtype=numpy.int64, buffer=self.memory.buf)
+        # the frame_time of the frame in each slot
+        self.frame_times = numpy.ndarray((self.SLOTS,), dtype=numpy.float64,
+                                         buffer=self.memory.buf, offset=self.HEADER * 8)
+        self.slots = numpy.ndarray((self.SLOTS,) + self.shape, dtype=numpy.float64,
+                                   buffer=self.memory.buf,
+                                   offset=(self.HEADER + self.SLOTS) * 8)
+        if create:
+            self.header[:] = 0
+            self.header[self.SLOTS] = -1
+            self.frame_times[:] = 0.0
+        # the frame_time of the last frame read
+        self.frame_time = None
+
+    def publish(self, number, data, frame_time):
+        """Write frame number (a FrameBuffer's data), rendered at frame_time,
+        into the next slot."""
+        slot = number % self.SLOTS
+        self.header[slot] += 1
+        numpy.copyto(self.slots[slot], data)
+        self.frame_times[slot] = frame_time
+        self.header[slot] += 1
+        self.header[self.SLOTS] = number
+
+    def latest(self):
+        """Number of the latest frame published, -1 if there's none yet."""
+        return int(self.header[self.SLOTS])
+
+    def read(self, out):
+        """Copy the latest frame into out, return its number (-1 if there
+        was nothing to copy). Its frame_time is left in self.frame_time."""
+        while True:
+            number = self.latest()
+            if number < 0:
+                return number
+            slot = number % self.SLOTS
+            sequence = self.header[slot]
+            if sequence % 2:
+                # being written right now
+                continue
+            numpy.copyto(out, self.slots[slot])
+            frame_time = float(self.frame_times[slot])
+            if self.header[slot] == sequence:
+                self.frame_time = frame_time
+                return number
+
+    def close(self):
+        # drop our views before closing, or the buffer can't be released
+        del self.header, self.frame_times, self.slots
+        self.memory.close()
+
+    def unlink(self):
+        self.memory.unlink()
+
+
+def route_prefix(address):
+    """The /<namespace>/<fn> an OSC path starts with, e.g. '/rosary/set_bundling'
+    for '/rosary/set_bundling/enabled/1'."""
+    return '/'.join(address.split('/', 3)[:3])
+
+
+def canvas_shape():
+    """Shape of a Rosary's canvas data, which is what goes through the FrameChannel."""
+    r = rosary.Rosary
+    return (r.BEAD_COUNT + r.BASE_COUNT + r.CROSS_LED_COUNT, frame.FrameBuffer.CHANNELS)
+
+
+def forward_commands(r, commands):
+    """Feed (address, args) from a multiprocessing queue to r, forever."""
+    while True:
+        address, args = commands.get()
+        try:
+            r.route_osc_call(address, *args)
+        except Exception:
+            traceback.print_exc()
+
+
+def render(channel_name, shape, notify, commands, setup=None):
+    """
+    The renderer process: run a Rosary's mainloop, apply the commands that
+    come in and publish every frame into the FrameChannel instead of sending
+    it, then tell the sender (over the notify pipe) it's there.
+    """
+    r = rosary.Rosary(sink=output.NullSink())
+    if setup is not None:
+        setup(r)
+    channel = FrameChannel(shape, name=channel_name)
+
+    frames = [0]
+
+    def publish():
+        channel.publish(frames[0], r.canvas.data, r.frame_time)
+        notify.send(frames[0])
+        frames[0] += 1
+
+    r.run_mainloop = True
+    threading.Thread(name='commands', target=forward_commands, args=(r, commands),
+                     daemon=True).start()
+    try:
+        r.mainloop(transmit=publish)
+    finally:
+        notify.close()
+        channel.close()
+
+
+def send(channel_name, shape, notify, commands, ip, port, setup=None):
+    """
+    The sender process: wait for the renderer's word that a frame is ready,
+    copy it out of the FrameChannel and send it. A Rosary (that never
+    renders anything) does the encoding, so output modes, bundling and
+    recording work as usual. Commands in SENDER_PATHS are applied between
+    frames. Interpolation goes by the frame_time each frame was rendered at,
+    as the frame rate is only set (and governed) in the renderer.
+    """
+    r = rosary.Rosary(ip, port)
+    if setup is not None:
+        setup(r)
+    channel = FrameChannel(shape, name=channel_name)
+
+    try:
+        while True:
+            try:
+                notify.recv()
+                # if we've fallen behind, just send the latest frame
+                while notify.poll():
+                    notify.recv()
+            except EOFError:
+                # the renderer is gone
+                return
+
+            while True:
+                try:
+                    address, args = commands.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    r.route_osc_call(address, *args)
+                except Exception:
+                    traceback.print_exc()
+
+            channel.read(r.canvas.data)
+            r.send_frame(channel.frame_time)
+    finally:
+        r.stop_interpolator()
+        r.set_recording(None)
+        channel.close()
+
+
+class RosaryProcesses:
+    """
+    RosaryProcesses runs a Rosary in two processes of its own: one renders
+    frames (and owns the effects), the other sends them. Whoever creates it
+    (e.g. the OSC server, see server.py --processes) only forwards OSC calls,
+    so network traffic, the shell and rendering no longer fight over one
+    interpreter (and GIL).
+
+    Frames go from the renderer to the sender through a FrameChannel in
+    shared memory, commands to the renderer through a multiprocessing queue.
+
+    render_setup(rosary) and send_setup(rosary) are called in the renderer
+    and the sender before they start, to load clips, turn on bundling, and
+    so on. They have to be picklable (i.e. module level functions).
+    """
+
+    def __init__(self, ip="127.0.0.1", port=5005, render_setup=None, send_setup=None):
+        self.shape = canvas_shape()
+        self.channel = FrameChannel(self.shape, create=True)
+        self.render_commands = multiprocessing.Queue()
+        self.send_commands = multiprocessing.Queue()
+        self.notify = multiprocessing.Pipe(duplex=False)
+        notify_recv, notify_send = self.notify
+
+        self.renderer = multiprocessing.Process(
+            name='render', target=render, daemon=True,
+            args=(self.channel.name, self.shape, notify_send, self.render_commands, render_setup))
+        self.sender = multiprocessing.Process(
+            name='send', target=send, daemon=True,
+            args=(self.channel.name, self.shape, notify_recv, self.send_commands,
+                  ip, port, send_setup))
+
+    def start(self):
+        self.renderer.start()
+        self.sender.start()
+        # the processes have their own ends of the pipe now
+        for connection in self.notify:
+            connection.close()
+
+    def route_osc_call(self, address, *args):
+        """Pass an OSC call on. Map this as the dispatcher's handler, like
+        Rosary.route_osc_call()."""
+        self.render_commands.put((address, args))
+        if route_prefix(address) in SENDER_PATHS:
+            self.send_commands.put((address, args))
+
+    def stop(self):
+        """Stop both processes and free the shared memory."""
+        for process in (self.renderer, self.sender):
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        self.channel.close()
+        self.channel.unlink()
@@ -0,0 +1,130 @@
+import collections
+import time
+
+from mp import pacer
+
+
+class Timings:
+    """Rolling timings (in ns) of one effect, or one class of effects."""
+
+    def __init__(self, window=300):
+        self.samples = collections.deque(maxlen=window)
+        self.calls = 0
+        self.max = 0
+        self.over_budget = 0
+
+    def add(self, ns):
+        self.samples.append(ns)
+        self.calls += 1
+        if ns > self.max:
+            self.max = ns
+
+    def summary(self):
+        """Return the timings as a dict, times in microseconds."""
+        samples = list(self.samples)
+        mean = sum(samples) / len(samples) if samples else 0
+        return {
+            'calls': self.calls,
+            'mean_us': round(mean / 1e3, 1),
+            'p99_us': round(pacer.percentile(samples, 99) / 1e3, 1),
+            'max_us': round(self.max / 1e3, 1),
+            'over_budget': self.over_budget,
+        }
+
+
+class EffectProfiler:
+    """
+    EffectProfiler times the rendering of every effect in Bin.next(), keeping
+    rolling statistics per effect id and per effect class.
+
+    When a whole frame takes longer than budget (seconds) to render, the
+    most expensive effect of that frame gets the blame: its over_budget
+    count goes up by one.
+
+    The profiler is off unless a Bin has one (Bin.profiler), so it costs
+    nothing when it's not in use.
+
+    The statistics of removed effects move to a table of the last
+    max_finished finished ones: short-lived effects are often the ones that
+    blew the budget.
+    """
+
+    def __init__(self, budget=1/30, window=300, clock=time.perf_counter_ns, max_finished=50):
+        self.budget = budget
+        self.window = window
+        self.clock = clock
+        self.by_id = {}
+        self.by_class = {}
+        self.effect_names = {}
+        self.max_finished = max_finished
+        self.finished = collections.OrderedDict()
+        self.frames = 0
+        self.frames_over_budget = 0
+
+    def reset(self):
+        self.by_id.clear()
+        self.by_class.clear()
+        self.effect_names.clear()
+        self.finished.clear()
+        self.frames = 0
+        self.frames_over_budget = 0
+
+    def timings(self, table, key):
+        t = table.get(key)
+        if t is None:
+            t = table[key] = Timings(self.window)
+        return t
+
+    def run(self, effects, render):
+        """Call render(effect) (which renders it, see Bin.next()) for each of
+        effects, timing each call."""
+        clock = self.clock
+        worst = None
+        worst_ns = -1
+        frame_start = clock()
+
+        for effect in effects:
+            start = clock()
+            render(effect)
+            ns = clock() - start
+
+            by_id = self.by_id.get(effect.id)
+            if by_id is None:
+                by_id = self.by_id[effect.id] = Timings(self.window)
+                self.effect_names[effect.id] = effect.name
+            by_id.add(ns)
+            self.timings(self.by_class, type(effect).__name__).add(ns)
+
+            if ns > worst_ns:
+                worst, worst_ns = effect, ns
+
+        self.frames += 1
+        if worst is not None and clock() - frame_start > self.budget * 1e9:
+            self.frames_over_budget += 1
+            self.by_id[worst.id].over_budget += 1
+            self.by_class[type(worst).__name__].over_budget += 1
+
+    def forget(self, id):
+        """Move the per-id statistics of an effect that has been removed to
+        the finished table."""
+        t = self.by_id.pop(id, None)
+        name = self.effect_names.pop(id, None)
+        if t is None:
+            return
+        self.finished[id] = dict(t.summary(), name=name)
+        if len(self.finished) > self.max_finished:
+            self.finished.popitem(last=False)
+
+    def summary(self):
+        """Return all the statistics as a dict (JSON friendly)."""
+        return {
+            'frames': self.frames,
+            'frames_over_budget': self.frames_over_budget,
+            'budget_us': round(self.budget * 1e6, 1),
+            'effects': {
+                str(id): dict(t.summary(), name=self.effect_names.get(id))
+                for id, t in self.by_id.items()
+            },
+            'finished': {str(id): summary for id, summary in self.finished.items()},
+            'classes': {name: t.summary() for name, t in self.by_class.items()},
+        }
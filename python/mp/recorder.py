@@ -0,0 +1,183 @@
+import contextlib
+import mmap
+import os
+import struct
+import time
+
+import numpy
+
+
+# log file layout:
+#   header: magic 'MPRL', version (uint16), padding, used length (uint64)
+#   then one record per frame:
+#     timestamp (float64, seconds since the recording started), packet count (uint32)
+#     and for each packet: length (uint32), payload
+# all little-endian.
+MAGIC = b'MPRL'
+VERSION = 1
+HEADER = struct.Struct('<4sHxxQ')
+FRAME = struct.Struct('<dI')
+PACKET = struct.Struct('<I')
+
+# the index (<log>.idx) is an array of (offset of the frame record, timestamp)
+INDEX_DTYPE = numpy.dtype([('offset', '<u8'), ('timestamp', '<f8')])
+
+
+def index_path(path):
+    return path + '.idx'
+
+
+class RecorderSink:
+    """
+    RecorderSink appends every frame's packets, with a monotonic timestamp,
+    to a memory-mapped log file, and passes them on to sink (if any).
+    replay.py plays the log back.
+
+    The file grows (and is re-mapped) as needed, in steps of at least
+    grow_size bytes; close() trims it and writes the index used for seeking.
+    """
+
+    def __init__(self, path, sink=None, grow_size=16 * 1024 * 1024, clock=time.monotonic):
+        self.path = path
+        self.sink = sink
+        self.grow_size = grow_size
+        self.clock = clock
+        self.start = clock()
+
+        # an index left over from an earlier recording would be trusted
+        # over scanning this log, should we not get to close()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(index_path(path))
+        self.file = open(path, 'w+b')
+        self.size = 0
+        self.map = None
+        self.grow(grow_size)
+
+        self.used = HEADER.size
+        self.write_header()
+
+        self.index = []
+        # offset of the current frame record, None between frames
+        self.frame_offset = None
+        self.packet_count = 0
+
+    def grow(self, needed):
+        size = self.size + max(needed, self.grow_size)
+        if self.map is not None:
+            self.map.close()
+        self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), size)
+        self.size = size
+
+    def reserve(self, length):
+        """Make sure there's room for length more bytes, return where they go."""
+        if self.used + length > self.size:
+            self.grow(length)
+        offset = self.used
+        self.used += length
+        return offset
+
+    def write_header(self):
+        HEADER.pack_into(self.map, 0, MAGIC, VERSION, self.used)
+
+    def send(self, payload):
+        if self.frame_offset is None:
+            self.frame_offset = self.reserve(FRAME.size)
+            self.packet_count = 0
+            self.timestamp = self.clock() - self.start
+
+        length = len(payload)
+        offset = self.reserve(PACKET.size + length)
+        PACKET.pack_into(self.map, offset, length)
+        self.map[offset + PACKET.size:offset + PACKET.size + length] = payload
+        self.packet_count += 1
+
+        if self.sink is not None:
+            self.sink.send(payload)
+
+    def end_frame(self):
+        if self.frame_offset is not None:
+            FRAME.pack_into(self.map, self.frame_offset, self.timestamp, self.packet_count)
+            self.index.append((self.frame_offset, self.timestamp))
+            # readers only look as far as the header says
+            self.write_header()
+            self.frame_offset = None
+
+        if self.sink is not None:
+            self.sink.end_frame()
+
+    def close(self):
+        """Finish the log: trim the file and write the index."""
+        if self.map is None:
+            return
+        self.end_frame()
+        self.map.flush()
+        self.map.close()
+        self.map = None
+        self.file.truncate(self.used)
+        self.file.close()
+        numpy.array(self.index, dtype=INDEX_DTYPE).tofile(index_path(self.path))
+
+
+class Recording:
+    """
+    Recording reads a log written by RecorderSink. Frames are read straight
+    from the memory-mapped file; the index is read from <log>.idx, or
+    rebuilt by scanning the log if that's missing (e.g. the recorder
+    didn't get to close()).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.used = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{} is not a version {} recording".format(path, VERSION))
+
+        if os.path.exists(index_path(path)):
+            self.index = numpy.fromfile(index_path(path), dtype=INDEX_DTYPE)
+        else:
+            self.index = self.scan()
+
+    def __len__(self):
+        return len(self.index)
+
+    def scan(self):
+        """Build the index by walking the frame records."""
+        index = []
+        offset = HEADER.size
+        while offset + FRAME.size <= self.used:
+            timestamp, packet_count = FRAME.unpack_from(self.map, offset)
+            index.append((offset, timestamp))
+            offset += FRAME.size
+            for i in range(packet_count):
+                length, = PACKET.unpack_from(self.map, offset)
+                offset += PACKET.size + length
+        return numpy.array(index, dtype=INDEX_DTYPE)
+
+    def seek(self, timestamp):
+        """Return the number of the first frame recorded at or after timestamp."""
+        return int(numpy.searchsorted(self.index['timestamp'], timestamp))
+
+    def frame(self, n):
+        """Return (timestamp, packets) of frame n. The packets are memoryviews
+        into the file."""
+        offset = int(self.index['offset'][n])
+        timestamp, packet_count = FRAME.unpack_from(self.map, offset)
+        offset += FRAME.size
+
+        view = memoryview(self.map)
+        packets = []
+        for i in range(packet_count):
+            length, = PACKET.unpack_from(self.map, offset)
+            offset += PACKET.size
+            packets.append(view[offset:offset + length])
+            offset += length
+        return timestamp, packets
+
+    def frames(self, start=0):
+        """Iterate over (timestamp, packets) from frame start on."""
+        for n in range(start, len(self)):
+            yield self.frame(n)
@@ -1,59 +1,146 @@
 #!/usr/bin/python3
 import ast
+import asyncio
 import code
+import collections
 import copy
+import functools
 import threading
 import time
 import math
+import os
+import traceback
 import inspect
+import json
+import logging
 import random
-import struct
 
-from pythonosc import udp_client
+import numpy
 from pythonosc import osc_bundle_builder
-from pythonosc import osc_message_builder
 
-from mp import color, effects, triggers
+from mp import clip, clocks, color, effects, encoder, frame, interpolator, output, pacer, pipeline, profiler, recorder, triggers
 from mp.dispatcher_mapper import DispatcherMapper
 
+logger = logging.getLogger(__name__)
+
 class Bead:
-    """Bead represents a single rosary bead."""
-    def __init__(self, index=0):
+    """Bead represents a single rosary bead.
+
+    A Bead doesn't own its color, it's a view over one row of a FrameBuffer.
+    """
+
+    __slots__ = ('index', 'frame_buffer', '_color')
+
+    def __init__(self, index=0, frame_buffer=None):
         self.index = int(index)
-        self.color = color.Color()
-        
+        if frame_buffer is None:
+            # a lone bead gets a (tiny) buffer of its own
+            frame_buffer = frame.FrameBuffer(count=self.index + 1)
+        self.frame_buffer = frame_buffer
+        self._color = frame.BeadColor(frame_buffer, self.index)
+
     def __repr__(self):
         return "Bead(index={}, color={})".format(self.index, self.color)
 
+    @property
+    def color(self):
+        return self._color
+
+    @color.setter
+    def color(self, color):
+        # assigning a Color copies it into the frame buffer rather than
+        # detaching the bead from it
+        self._color.copy(color)
+
     def copy_color(self, color):
         """Helper function that sets the Bead color by copying a Color object."""
-        self.color = copy.copy(color)
+        self._color.copy(color)
+
+
+# A parsed OSC path, see Rosary.parse_route(). Calls whose routes share a
+# (non-None) coalesce_key set the same knob, so only the last one matters.
+Route = collections.namedtuple('Route', 'namespace handler kwargs coalesce_key')
 
 
 class Updater:
-    def __init__(self, name='', bead_list=[], osc_client=None):
+    """Updater transmits one class of LEDs (rosary, base or cross) as /bead
+    OSC messages, encoded straight from its FrameBuffer.
+
+    By default every update() sends the whole frame. In delta mode the
+    Updater remembers the last frame it sent, and only sends the contiguous
+    ranges of beads that changed since (nothing at all if nothing changed).
+    Every keyframe_interval frames the whole frame is sent regardless, so a
+    receiver that missed a packet catches up.
+
+    knobs:
+    * delta: send only what changed
+    * keyframe_interval: number of frames between full frames in delta mode
+    * merge_gap: changed ranges separated by this many unchanged beads (or
+                 fewer) are sent as one range
+    """
+
+    def __init__(self, name='', bead_list=[], frame_buffer=None, sink=None):
         self.name = name
         self.bead_list = bead_list
-        self.osc_client=osc_client
-        
-    def update(self):
-        msg = osc_message_builder.OscMessageBuilder(address = "/bead")
-        msg.add_arg(self.name)                 # name (class)
-        msg.add_arg(int(0))                    # base
-        msg.add_arg(int(len(self.bead_list)))  # length
-        
-        payload = bytearray()
-        for bead in self.bead_list:
-            payload.extend(struct.pack('!HHHH',
-                                       int(bead.color.r * 0xffff),
-                                       int(bead.color.g * 0xffff),
-                                       int(bead.color.b * 0xffff),
-                                       int(bead.color.brightness)
-            ))
+        self.frame_buffer = frame_buffer
+        self.sink = sink
+        self.encoder = encoder.BeadEncoder(name, len(frame_buffer))
 
-        msg.add_arg(bytes(payload))
+        self.delta = False
+        self.keyframe_interval = 30
+        self.merge_gap = 4
+        # what the receiver has, as far as we know
+        self.last_payload = None
+        self.frames_since_keyframe = 0
 
-        self.osc_client.send(msg.build())
+    def update(self):
+        message = self.encoder.encode(self.frame_buffer.data)
+
+        if not self.delta:
+            self.sink.send(message)
+            return
+
+        payload = self.encoder.payload
+        # counting this one, so a keyframe goes out every keyframe_interval frames
+        self.frames_since_keyframe += 1
+        if (self.last_payload is None or
+            self.frames_since_keyframe >= self.keyframe_interval):
+            self.send_keyframe()
+            return
+
+        changed = numpy.flatnonzero((payload != self.last_payload).any(axis=1))
+        if len(changed) == 0:
+            return
+
+        ranges = self.dirty_ranges(changed)
+        # lots of little ranges can cost more than just sending everything
+        size = sum(length for base, length in ranges) * self.encoder.BEAD_SIZE + \
+               len(ranges) * self.encoder.payload_offset
+        if size >= len(message):
+            self.send_keyframe()
+            return
+
+        for base, length in ranges:
+            self.sink.send(self.encoder.message_range(base, length))
+        numpy.copyto(self.last_payload, payload)
+
+    def send_keyframe(self):
+        """Send the whole (already encoded) frame and remember it."""
+        self.sink.send(self.encoder.message)
+        if self.last_payload is None:
+            self.last_payload = self.encoder.payload.copy()
+        else:
+            numpy.copyto(self.last_payload, self.encoder.payload)
+        self.frames_since_keyframe = 0
+
+    def dirty_ranges(self, changed):
+        """Turn a sorted array of changed bead indices into a list of
+        (base, length) ranges, merging ranges separated by merge_gap or
+        fewer unchanged beads."""
+        breaks = numpy.flatnonzero(numpy.diff(changed) > self.merge_gap + 1)
+        starts = changed[numpy.concatenate(([0], breaks + 1))]
+        ends = changed[numpy.concatenate((breaks, [len(changed) - 1]))]
+        return [(int(start), int(end - start + 1)) for start, end in zip(starts, ends)]
 
 
 class Rosary:
@@ -66,7 +153,12 @@ class Rosary:
     # Can't decorate with @self.r, so need this here
     dm = DispatcherMapper()
 
-    def __init__(self, ip="127.0.0.1", port=5005, dispatcher=None, name="rosary"):
+    BEAD_COUNT = 60
+    BASE_COUNT = 9
+    CROSS_LED_COUNT = 480
+
+    def __init__(self, ip="127.0.0.1", port=5005, dispatcher=None, name="rosary", sink=None,
+                 clock=None):
         self.beads = []
         self.bases = []
         self.cross = []
@@ -75,40 +167,90 @@ class Rosary:
         self.osc_ip = ip
         self.osc_port = port
         self.trigger_id = 0
-        self.BEAD_COUNT=60
-        self.BASE_COUNT=9
-        self.CROSS_LED_COUNT=480
         self.run_mainloop = False
+        # OSC calls waiting for the start of the next frame, see route_osc_call()
+        self.commands = collections.deque()
+        self.commands_applied = 0
+        self.commands_coalesced = 0
         self.frame_time = 1 / 30   # reciprocal of fps
+        # time the next frame has to make up for, see render_paced_frame()
+        self.catchup_time = 0.0
+        # an mp.pacer.FrameRateGovernor, when the frame rate is governed
+        self.governor = None
+        self.pacer = pacer.FramePacer(self.frame_time)
+        # what the pacer tells the time with, see set_clock()
+        self.clock = None
+        self.set_clock(clock if clock is not None else clocks.SystemClock())
+        # all the randomness (including each effect's, see Effect.random)
+        # comes from here, see seed()
+        self.random_seed = None
+        self.random = random.Random()
+        # render this many frames ahead of the one being sent, 0 for not at
+        # all (see mp.pipeline.FramePipeline), and the pipeline when running
+        self.pipeline_depth = 0
+        self.pipeline = None
+        # send this many frames per frame rendered, blending in between (see
+        # mp.interpolator.FrameInterpolator), and the interpolator when running
+        self.interpolation = 1
+        self.interpolator = None
         self.effect_registry = {}
         self.trigger_registry = {}
+        # baked triggers: name -> mp.clip.Clip, played instead of the trigger
+        self.clip_registry = {}
         # Reasonable defaults
         self.name = name
         self.dispatcher = dispatcher
-        # Available knobs to turn
+        # Available knobs to turn: knob name -> effect id -> bound method,
+        # the reverse index effect id -> knob names, and the bound methods
+        # of each knob as a tuple, built on demand by turn_knob()
         self.knobs = {}
+        self.effect_knobs = {}
+        self.knob_callables = {}
+        # OSC paths we've already made sense of, least recently used first
+        self.routes = collections.OrderedDict()
+        self.route_cache_size = 512
+        self.route_hits = 0
+        self.route_misses = 0
         self.updater_list = []
 
-        self.osc_client = udp_client.UDPClient(self.osc_ip, self.osc_port)
-
-        # create the three classes of LED "beads"
+        # where the encoded frames go - oscled over UDP unless told otherwise
+        if sink is None:
+            sink = output.UDPSink(self.osc_ip, self.osc_port)
+        self.sink = sink
+        # held while a frame is sent and while the way frames are sent
+        # (sink, output mode) changes: frames can go out from a thread of
+        # their own (mp.pipeline, mp.interpolator) while OSC calls are
+        # applied on the render thread
+        self.send_lock = threading.RLock()
+
+        # create the three classes of LED "beads", each class backed by
+        # one contiguous frame buffer. The three of them are consecutive
+        # parts of one canvas, so the whole frame can be worked on at once
+        self.canvas = frame.FrameBuffer('canvas', self.BEAD_COUNT + self.BASE_COUNT + self.CROSS_LED_COUNT)
+        self.rosary_buffer = self.canvas.view('rosary', 0, self.BEAD_COUNT)
         for i in range(self.BEAD_COUNT):
-            self.beads.append(Bead(i))
+            self.beads.append(Bead(i, self.rosary_buffer))
         self.updater_list.append(Updater(name='rosary',
                                          bead_list=self.beads,
-                                         osc_client=self.osc_client))
+                                         frame_buffer=self.rosary_buffer,
+                                         sink=self.sink))
 
+        self.base_buffer = self.canvas.view('base', self.BEAD_COUNT, self.BASE_COUNT)
         for i in range(self.BASE_COUNT):
-            self.bases.append(Bead(i))
+            self.bases.append(Bead(i, self.base_buffer))
         self.updater_list.append(Updater(name='base',
                                          bead_list=self.bases,
-                                         osc_client=self.osc_client))
+                                         frame_buffer=self.base_buffer,
+                                         sink=self.sink))
 
+        self.cross_buffer = self.canvas.view('cross', self.BEAD_COUNT + self.BASE_COUNT,
+                                             self.CROSS_LED_COUNT)
         for i in range(self.CROSS_LED_COUNT):
-            self.cross.append(Bead(i))
+            self.cross.append(Bead(i, self.cross_buffer))
         self.updater_list.append(Updater(name='cross',
                                          bead_list=self.cross,
-                                         osc_client=self.osc_client))
+                                         frame_buffer=self.cross_buffer,
+                                         sink=self.sink))
 
 
         # some useful predefined sets of beads
@@ -146,6 +288,14 @@ class Rosary:
         self.set_registry['half30'] = self.set_registry['quadrent3'].\
                                            union(self.set_registry['quadrent0'])
 
+        # sorted bead sets, see Effect.set_bead_set(). All the predefined
+        # sets are sorted up front, so adding an effect or firing a trigger
+        # finds them in the cache
+        self.bead_sets = effects.effect.BeadSetCache()
+        for bead_set in self.set_registry.values():
+            for ordering in effects.effect.SORT_KEYS:
+                self.bead_sets.get(bead_set, ordering)
+
         # some useful predefined colors
         self.color_registry = {
             'white': color.Color(1,1,1,1),
@@ -180,6 +330,10 @@ class Rosary:
         for bead in beads:
             bead.color.set(self.bgcolor)
 
+    def clear_frame(self):
+        """Set every bead of every class to the background color."""
+        self.canvas.clear(self.bgcolor)
+
     ##########################################################################
     # INITIALIZATION STUFF - DISCOVER WRITTEN MODULES
     ##########################################################################
@@ -225,8 +379,10 @@ class Rosary:
 
         defined_effects = self.find_written_effects(effects)
         for eff in defined_effects:
-            # Don't register abstract classes, e.g. effects.effect.Effect
-            if not inspect.isabstract(eff) and issubclass(eff, effects.effect.Effect):
+            # Don't register abstract classes, e.g. effects.effect.Effect,
+            # or effects that can't be added by name
+            if (not inspect.isabstract(eff) and issubclass(eff, effects.effect.Effect)
+                    and eff.auto_register):
                 self.register_effect(eff)
 
 
@@ -318,12 +474,13 @@ class Rosary:
         bead_set_name = kwargs.get('bead_set', 'rosary')
         bead_set_sort = kwargs.get('bead_set_sort', 'cw')
 
-        # Accept either a color name or rgb values
+        # Accept either a color name or rgb values. Effects' layers are
+        # composited by alpha, so rgb values are opaque unless told otherwise
         color_name = kwargs.get('color', 'white')
         r = kwargs.get('r', 0.0)
         g = kwargs.get('g', 0.0)
         b = kwargs.get('b', 0.0)
-        a = kwargs.get('a', 0.0)
+        a = kwargs.get('a', 1.0)
 
         # If you don't pass in a good name I'll pretend I didn't hear you
         bead_set = self.set_registry.get(bead_set_name.lower(),
@@ -336,7 +493,7 @@ class Rosary:
 
         # If all else fails, just pick a random color from the registry
         while effect_color in (None, color.Color(0,0,0)):
-            effect_color = random.choice(list(self.color_registry.values()))
+            effect_color = self.random.choice(list(self.color_registry.values()))
 
         # Whether we're overwriting the string or setting for the first time,
         # it's all the same to us
@@ -347,27 +504,40 @@ class Rosary:
         # I'd rather be fancy and strip out kwargs that won't be accepted
         # than force people writing effects to take **kwargs /flex
         requested_effect = self.effect_registry.get(effect_name)
-        requested_effect_args = inspect.getargspec(requested_effect).args
+        if requested_effect is None:
+            return None
+        requested_effect_args = inspect.getfullargspec(requested_effect).args
         # I don't want to add this to all the effects that are already written, but this
         # solution feels like a gross hack
         requested_effect_args.append('bead_set_sort')
+        # same for how the effect is composited, see Effect.__init__()
+        requested_effect_args.extend(('blend_mode', 'opacity'))
 
         # Er, "clean up" the kwargs to pass to an effect init method
         for key in list(kwargs):
             if key not in requested_effect_args:
                 kwargs.pop(key)
 
-        if requested_effect is not None:
-            effect_id = self.bin.add_effect_object(requested_effect(*args, rosary=self, **kwargs))
-            self.expose_effect_knobs(requested_effect)
-            return effect_id
-        else:
-            return None
+        return self.add_effect_object(requested_effect(*args, rosary=self, **kwargs))
+
+    def add_effect_object(self, effect):
+        """
+        Add an already created Effect object to the running effects and
+        make its knobs available. Returns the id of the effect.
+        """
+        effect_id = self.bin.add_effect_object(effect)
+        self.expose_effect_knobs(effect)
+        return effect_id
 
     @dm.expose()
     def del_effect(self, id):
         self.bin.del_effect(id)
 
+    @dm.expose()
+    def move_effect(self, id, position):
+        """Move an effect to position in the rendering order (0 is rendered first)."""
+        self.bin.move_effect(id, position)
+
     @dm.expose()
     def clear_effects(self):
         self.bin.clear_effects()
@@ -381,6 +551,23 @@ class Rosary:
         for eff in self.bin.effects:
             eff.fade_out(30)
 
+    @dm.expose()
+    def load_clip(self, path, name=None):
+        """
+        Load a clip baked with bake.py. Firing the trigger called name (the
+        clip's file name without the extension, by default) plays the clip
+        instead of running the trigger.
+        """
+        c = clip.Clip(path)
+        self.clip_registry[name or c.name] = c
+        return c
+
+    def load_clips(self, directory):
+        """Load all the *.clip files in directory, see load_clip()."""
+        for file_name in sorted(os.listdir(directory)):
+            if file_name.endswith('.clip'):
+                self.load_clip(os.path.join(directory, file_name))
+
     @dm.expose()
     def clear_triggers(self):
         """
@@ -391,6 +578,210 @@ class Rosary:
             tr = self.triggers[-1]
             self.triggers.remove(tr)
 
+    @dm.expose()
+    def set_output_mode(self, mode='full', keyframe_interval=None, merge_gap=None):
+        """
+        'full' sends every bead of every class every frame. 'delta' only
+        sends the beads that changed, with a full keyframe every
+        keyframe_interval frames.
+        """
+        with self.send_lock:
+            for updater in self.updater_list:
+                updater.delta = (mode == 'delta')
+                # start the new mode with a keyframe
+                updater.last_payload = None
+                if keyframe_interval is not None:
+                    updater.keyframe_interval = int(keyframe_interval)
+                if merge_gap is not None:
+                    updater.merge_gap = int(merge_gap)
+
+    @dm.expose()
+    def set_bundling(self, enabled=1, latency=0.0):
+        """
+        Send each frame as a single OSC bundle (see mp.output.BundleSink)
+        instead of one /bead message per class of LEDs. The bundle is
+        timetagged to be shown latency seconds after it's sent, or as soon
+        as it arrives if latency is 0.
+        """
+        with self.send_lock:
+            sink = self.sink
+            if isinstance(sink, output.BundleSink):
+                sink = sink.sink
+            if enabled:
+                sink = output.BundleSink(sink, latency=float(latency))
+
+            self.set_sink(sink)
+
+    @dm.expose()
+    def set_recording(self, path=None):
+        """
+        Record every frame sent to path (see mp.recorder.RecorderSink and
+        replay.py), or stop recording if path is None. Frames are recorded
+        the way they go out, bundled or not.
+        """
+        with self.send_lock:
+            bundle = self.sink if isinstance(self.sink, output.BundleSink) else None
+            sink = bundle.sink if bundle else self.sink
+            if isinstance(sink, recorder.RecorderSink):
+                sink.close()
+                sink = sink.sink
+            if path:
+                sink = recorder.RecorderSink(path, sink)
+
+            if bundle:
+                bundle.sink = sink
+            else:
+                self.set_sink(sink)
+
+    def set_sink(self, sink):
+        """Send frames to sink from now on."""
+        with self.send_lock:
+            self.sink = sink
+            for updater in self.updater_list:
+                updater.sink = sink
+
+    def set_clock(self, clock):
+        """
+        Pace frames by clock (see mp.clocks), e.g. an mp.clocks.VirtualClock
+        to run as fast as possible while the pacer sees time go by as usual.
+        There's no busy-waiting on a virtual clock, it would never get there.
+        """
+        self.clock = clock
+        self.pacer.clock = clock.now
+        self.pacer.sleep = clock.sleep
+        if clock.virtual:
+            self.pacer.spin = 0
+
+    @dm.expose()
+    def seed(self, seed=None):
+        """
+        Make all the randomness (color picks, sparkles...) repeatable: the
+        same seed and the same commands give the same frames. None goes back
+        to unpredictable.
+        """
+        self.random_seed = seed
+        self.random.seed(seed)
+        for effect in self.bin.effects:
+            effect.reseed()
+
+    @dm.expose()
+    def set_pacer(self, policy=None, max_catchup=None, spin=None):
+        """
+        Change how the mainloop paces frames (see mp.pacer.FramePacer).
+        spin is in seconds, 0 turns busy-waiting off.
+        """
+        if policy is not None:
+            self.pacer.set_policy(policy)
+        if max_catchup is not None:
+            self.pacer.max_catchup = int(max_catchup)
+        if spin is not None:
+            self.pacer.spin = float(spin)
+
+    @dm.expose()
+    def set_fps(self, fps):
+        """Render (and send) fps frames per second from the next frame on."""
+        fps = float(fps)
+        if fps > 0:
+            self.frame_time = 1 / fps
+
+    @dm.expose()
+    def set_governor(self, enabled=1, min_fps=20, max_fps=30):
+        """
+        Let an mp.pacer.FrameRateGovernor step the frame rate down (30, 24,
+        20 fps, within min_fps and max_fps) when rendering can't keep up,
+        and back up when it can. Its decisions show up in stats().
+        """
+        if not enabled:
+            self.governor = None
+            return
+
+        rates = [rate for rate in (60, 30, 24, 20, 15)
+                 if float(min_fps) <= rate <= float(max_fps)]
+        self.governor = pacer.FrameRateGovernor(rates=rates or [float(max_fps)])
+        fps = 1 / self.frame_time
+        if fps not in self.governor.rates:
+            # start at the top of the ladder
+            self.set_fps(self.governor.rates[0])
+
+    @dm.expose()
+    def set_interpolation(self, factor=1):
+        """
+        Send factor frames for every frame rendered, blended from one to the
+        next, for smoother motion at factor times the frame rate. 1 turns
+        it off. Takes effect with the next frame sent, from mainloop() (but
+        not with pipeline_depth set) and the sender of mp.processes.
+        """
+        self.interpolation = max(1, int(factor))
+
+    def govern(self, render_time, late):
+        """Tell the governor (if any) about a frame, and change the frame
+        rate if it says so."""
+        if self.governor is None:
+            return
+        fps = self.governor.update(render_time, late, 1 / self.frame_time)
+        if fps is not None:
+            self.set_fps(fps)
+
+    @dm.expose()
+    def set_profiling(self, enabled=1, window=300):
+        """
+        Turn per-effect timing on or off (see mp.profiler.EffectProfiler).
+        Turning it on again starts from fresh statistics.
+        """
+        if enabled:
+            self.bin.profiler = profiler.EffectProfiler(budget=self.frame_time,
+                                                        window=int(window))
+        else:
+            self.bin.profiler = None
+
+    @dm.expose()
+    def set_render_threads(self, threads=1):
+        """
+        Render the effects' layers with a pool of threads (see
+        mp.effects.bin.Bin.set_render_threads()), 1 to go back to rendering
+        them one after the other.
+        """
+        self.bin.set_render_threads(int(threads))
+
+    @dm.expose()
+    def stats(self, path=None):
+        """
+        Gather the frame timing, OSC route cache and (if profiling is on)
+        per-effect statistics. Over OSC there's nobody to return them to, so
+        they're logged (at INFO level), or written to path as JSON. Paths
+        have slashes in them, so send the path as an argument:
+        /rosary/stats ,s /tmp/stats.json
+        """
+        stats = {
+            'frames': self.frame_stats(),
+            'routes': self.route_cache_stats(),
+            'commands': {
+                'queued': len(self.commands),
+                'applied': self.commands_applied,
+                'coalesced': self.commands_coalesced,
+            },
+            'effects': None,
+            'pipeline': None,
+            'governor': None,
+            'interpolator': None,
+        }
+        if self.interpolator is not None:
+            stats['interpolator'] = self.interpolator.summary()
+        if self.governor is not None:
+            stats['governor'] = dict(self.governor.summary(), fps=round(1 / self.frame_time, 2))
+        if self.pipeline is not None:
+            stats['pipeline'] = self.pipeline.summary()
+        if self.bin.profiler is not None:
+            stats['effects'] = self.bin.profiler.summary()
+
+        if path:
+            with open(path, 'w') as f:
+                json.dump(stats, f, indent=2)
+        else:
+            logger.info("stats: %s", json.dumps(stats, indent=2))
+
+        return stats
+
     @dm.expose()
     def start(self, interactive=False):
         """Start the animation loop (aka, mainloop()) and create a shell for live interaction."""
@@ -407,6 +798,7 @@ class Rosary:
     def stop(self):
         """Stop the mainloop and exit the application."""
         self.run_mainloop = False
+        self.set_recording(None)
         exit(0)
 
 
@@ -428,30 +820,31 @@ class Rosary:
 
         # NOTE: self.knobs looks like:
         # {
-        #   'set_color': [
-        #       (<function reference>, <effect instance>),
-        #       (<function reference>, <effect instance>)
-        #   ]
+        #   'set_color': {
+        #       <effect id>: <bound method>,
+        #       <effect id>: <bound method>
+        #   }
+        # }
+        # and self.effect_knobs, the reverse index, like:
+        # {
+        #   <effect id>: (<effect instance>, ['set_color', 'set_speed', ...])
         # }
 
-
-        # Use list instead of self.knobs.keys() to avoid
-        # "RuntimeError: dictionary changed size during iteration"
-        # https://stackoverflow.com/a/11941855
-        for fn_name in list(self.knobs):
-            mappings = self.knobs[fn_name]
-            # Traverse backwards so that we can remove items without
-            # accidentally skipping an item due to timing
-            for mapping in reversed(mappings):
-                mapped_fn = mapping[0]
-                mapped_effect = mapping[1]
-                if effect == mapped_effect:
-                    mappings.remove(mapping)
-
-            # If self.knobs[fn_name] is left with an empty list,
+        entry = self.effect_knobs.get(effect.id)
+        # effects in nested bins have ids of their own, which may clash with
+        # the ones in our bin - make sure it's really the same effect
+        if entry is None or entry[0] is not effect:
+            return
+        del self.effect_knobs[effect.id]
+
+        for fn_name in entry[1]:
+            mappings = self.knobs.get(fn_name, {})
+            mappings.pop(effect.id, None)
+            # If self.knobs[fn_name] is left empty,
             # remove `fn_name` from self.knobs as well
-            if len(mappings) < 1:
-                self.knobs.pop(fn_name)
+            if not mappings:
+                self.knobs.pop(fn_name, None)
+            self.knob_callables.pop(fn_name, None)
 
 
     def expose_effect_knobs(self, effect):
@@ -460,77 +853,191 @@ class Rosary:
         `dm.expose()`-ed functions
         """
 
-        #if not effect.registered:
-        for fn_name, fn in effect.dm.exposed_methods.items():
-            if fn_name in self.knobs.keys():
-                self.knobs[fn_name].append( (fn, effect) )
-            else:
-                self.knobs[fn_name] = [ (fn, effect) ]
+        # some knobs only make sense for one effect at a time, those are
+        # turned with /rosary/effect/<id>/<knob> (see turn_effect_knob())
+        fn_names = [fn_name for fn_name in effect.dm.exposed_methods
+                    if fn_name not in effect.PER_EFFECT_KNOBS]
+        for fn_name in fn_names:
+            fn = effect.dm.exposed_methods[fn_name]
+            # bind the function to the effect instance
+            self.knobs.setdefault(fn_name, {})[effect.id] = fn.__get__(effect, type(effect))
+            self.knob_callables.pop(fn_name, None)
+        self.effect_knobs[effect.id] = (effect, fn_names)
 
         effect.registered = True
 
 
+    def render_frame(self, dt=None):
+        """Clear the frame buffers and move all the effects on by dt seconds
+        (frame_time if None)."""
+        self.clear_frame()
+        self.bin.next(self.frame_time if dt is None else dt)
+
+    def transmit_frame(self):
+        """Send the current frame buffers to the LEDs."""
+        with self.send_lock:
+            for updater in self.updater_list:
+                updater.update()
+            self.sink.end_frame()
+
+    def send_frame(self, frame_time=None):
+        """
+        Send the current frame: transmit_frame(), or with interpolation on,
+        hand it to an mp.interpolator.FrameInterpolator, started and stopped
+        here as interpolation is turned on and off. frame_time is how long
+        until the next frame (self.frame_time if None), for frames rendered
+        somewhere else, see mp.processes.
+        """
+        if self.interpolation > 1 and self.interpolator is None:
+            self.interpolator = interpolator.FrameInterpolator(self, self.interpolation)
+            self.interpolator.start()
+        elif self.interpolation <= 1 and self.interpolator is not None:
+            self.stop_interpolator()
+
+        if self.interpolator is None:
+            self.transmit_frame()
+        else:
+            self.interpolator.push(self.canvas.data, frame_time)
+
+    def stop_interpolator(self):
+        if self.interpolator is not None:
+            self.interpolator.stop()
+            self.interpolator = None
+
+    def run_frames(self, n, paced=False, sink=None):
+        """
+        Render and transmit n frames on the calling thread, as the mainloop
+        would, then return. OSC calls made in between are applied right away.
+
+        Unless paced, frames are rendered back to back, as fast as the CPU
+        allows, and a virtual clock is moved on by a frame_time per frame:
+        ten minutes of show in a few seconds, for baking, benchmarking and
+        comparing output. Frames go to sink if given (for this run only),
+        the rosary's own sink otherwise.
+        """
+        frame_pacer = self.pacer
+        if paced:
+            frame_pacer.frame_time = self.frame_time
+            frame_pacer.start()
+
+        previous_sink = self.sink
+        if sink is not None:
+            self.set_sink(sink)
+        try:
+            for i in range(n):
+                if paced:
+                    self.render_paced_frame()
+                    frame_pacer.wait()
+                else:
+                    self.apply_commands()
+                    self.render_frame()
+                    self.clock.advance(self.frame_time)
+                self.transmit_frame()
+        finally:
+            if sink is not None:
+                self.set_sink(previous_sink)
+
     def mainloop(self, *args, **kwargs):
         """This is the animiation loop. It cycles through all active effects
         and invokes next() on each effect.
 
+        Frame timing is left to self.pacer (see mp.pacer.FramePacer), which
+        also keeps the frame statistics returned by frame_stats().
+
         knobs:
         * frame_time: how much wall-clock time to allocate to each update
+        * transmit: what to do with each frame when it's due, send_frame()
+          unless told otherwise (see mp.processes)
 
+        With pipeline_depth set, rendering and sending are done by an
+        mp.pipeline.FramePipeline instead.
         """
 
-        frame_time = kwargs.get('frame_time', self.frame_time)
+        self.frame_time = kwargs.get('frame_time', self.frame_time)
+        transmit = kwargs.get('transmit', self.send_frame)
+        if self.pipeline_depth > 0 and 'transmit' not in kwargs:
+            self.pipeline = pipeline.FramePipeline(self, self.pipeline_depth)
+            try:
+                self.pipeline.run()
+            finally:
+                self.pipeline = None
+            return
 
-        next_frame_time = time.monotonic()
-        
-        # # setup data[] for running average of last 60 time deltas
-        # data = []
-        # for i in range(60):
-        #     data.append(0)
+        frame_pacer = self.pacer
+        frame_pacer.frame_time = self.frame_time
+        frame_pacer.start()
 
-        while (self.run_mainloop):
-            next_frame_time += self.frame_time
+        try:
+            while (self.run_mainloop):
+                self.render_paced_frame()
 
-            bead_list = kwargs.get('bead_list')
+                # sleep (and spin) until the frame is due
+                frame_pacer.wait()
 
-            for updater in self.updater_list:
-                self.beads_set_bgcolor(updater.bead_list)
+                # update the LEDs
+                # do this last to try to make the updates as regular as possible
+                transmit()
+        finally:
+            self.stop_interpolator()
 
-            # advance the state of all the effects
-            self.bin.next()
+    async def mainloop_async(self, *args, **kwargs):
+        """
+        mainloop() as a coroutine, so OSC messages and frames can share one
+        asyncio event loop (see server.py --asyncio) instead of running on
+        separate threads. Handlers then never run in the middle of a frame.
 
-            # Let the triggers figure out for themselves what to do
-            #for trigger in self.triggers.values():
-            #    if trigger.running:
-            #        trigger.next()
+        There's no busy-waiting here, that would starve the OSC endpoint:
+        between frames the loop is free to handle incoming messages.
 
-            # store the time - we will use this to decide how long to sleep
-            now = time.monotonic()
+        Frames are rendered and sent on the loop, one after the other, so
+        there's no pipeline_depth or interpolation: ValueError if either is
+        set, and /rosary/set_interpolation is turned down while running.
+        """
 
-            # drop a frame if we've already passed next_frame_time
-            while (now > next_frame_time):
-                print('frame drop')
-                next_frame_time += self.frame_time
-                # "dropping a frame" means calling next() on all the effects w/o updating the LEDs
-                self.bin.next()
+        if self.pipeline_depth > 0 or self.interpolation > 1:
+            raise ValueError("mainloop_async() can't render ahead (pipeline_depth) "
+                             "or interpolate, use mainloop()")
 
-                now = time.monotonic()
+        self.frame_time = kwargs.get('frame_time', self.frame_time)
+        frame_pacer = self.pacer
+        frame_pacer.frame_time = self.frame_time
+        frame_pacer.start()
+        self.run_mainloop = True
+
+        while (self.run_mainloop):
+            self.render_paced_frame()
+            if self.interpolation > 1:
+                logger.warning("interpolation isn't available with mainloop_async(), ignored")
+                self.interpolation = 1
+            await asyncio.sleep(frame_pacer.time_left())
+            frame_pacer.frame_due()
+            self.transmit_frame()
+
+    def render_paced_frame(self):
+        """
+        Render the next frame. When the pacer says we're behind, the frame
+        after this one moves the effects on by the missed frames as well,
+        rather than rendering frames that would never be sent.
+        """
+        frame_pacer = self.pacer
 
-            # # compute a running average of the last 60 time deltas
-            # if (i == 60):
-            #     print(sum(data) / 60)
-            #     i = 0
-            # data[i] = next_frame_time - now
-            # i += 1
+        # pick up changes made on the fly
+        frame_pacer.frame_time = self.frame_time
+        if self.bin.profiler is not None:
+            self.bin.profiler.budget = self.frame_time
 
-            # sleep our estimated drift time
-            time.sleep(next_frame_time - now)
+        frame_pacer.frame_started()
+        self.apply_commands()
+        self.render_frame(self.frame_time + self.catchup_time)
 
-            # update the LEDs
-            # do this last to try to make the updates as regular as possible
-            for updater in self.updater_list:
-                updater.update()
+        # the pacer decides how many missed frames to make up for
+        late = frame_pacer.stats.late
+        self.catchup_time = frame_pacer.frame_rendered() * self.frame_time
+        self.govern(frame_pacer.stats.render[-1], frame_pacer.stats.late > late)
 
+    def frame_stats(self):
+        """Return the pacer's rolling frame timing statistics as a dict."""
+        return self.pacer.stats.summary()
 
 
     ##########################################################################
@@ -543,8 +1050,13 @@ class Rosary:
         # but just in case, get everyone's names
         running_trigger_names = [t.name for t in self.triggers]
 
+        # A baked trigger is just played back
+        baked = self.clip_registry.get(trigger_name)
+        if baked is not None and any(getattr(e, 'clip', None) is baked for e in self.bin.effects):
+            running_trigger_names.append(trigger_name)
+
         # Don't want to restart a running trigger
-        if requested_trigger is not None and \
+        if (requested_trigger is not None or baked is not None) and \
            trigger_name not in running_trigger_names:
 
             # Kill all existing triggers
@@ -553,7 +1065,10 @@ class Rosary:
             # Start fading out all existing effects
             self.clear_effects_fade()
 
-            self.add_trigger_object(requested_trigger(*args, **kwargs))
+            if baked is not None:
+                self.add_effect_object(effects.clip_player.ClipPlayer(clip=baked, rosary=self))
+            else:
+                self.add_trigger_object(requested_trigger(*args, **kwargs))
 
 
     def turn_knob(self, knob_name, *args, **kwargs):
@@ -562,14 +1077,136 @@ class Rosary:
         turn the knob (we're assured they're all running effects)
         """
 
-        for fn, instance in self.knobs.get(knob_name, []):
-            fn(instance, *args, **kwargs)
+        callables = self.knob_callables.get(knob_name)
+        if callables is None:
+            mappings = self.knobs.get(knob_name)
+            if mappings is None:
+                return
+            callables = tuple(mappings.values())
+            self.knob_callables[knob_name] = callables
+
+        for fn in callables:
+            fn(*args, **kwargs)
+
+
+    def turn_effect_knob(self, id, knob_name, *args, **kwargs):
+        """Turn knob_name of the running effect with this id only."""
+        entry = self.effect_knobs.get(id)
+        if entry is None:
+            return
+        effect = entry[0]
+        fn = effect.dm.exposed_methods.get(knob_name)
+        if fn is not None:
+            fn(effect, *args, **kwargs)
 
 
     def route_osc_call(self, full_path, *args, **kwargs):
         """
         Figure out what the OSC path means and, well, do what the
         runes instruct us to do.
+
+        While the mainloop is running, calls aren't made right away (on
+        whatever thread received the packet, in the middle of a frame) but
+        queued, and applied by the mainloop at the start of the next frame
+        (see apply_commands()).
+        """
+
+        if self.run_mainloop:
+            # deque.append() is atomic, no lock needed
+            self.commands.append((full_path, args))
+            return
+
+        try:
+            self.call_route(self.route(full_path), args)
+        except Exception:
+            traceback.print_exc()
+
+    def apply_commands(self):
+        """
+        Apply the OSC calls queued since the last frame, in the order they
+        came in. Of several knob writes to the same target (same knob, same
+        arguments), only the last one is applied.
+
+        Only the calls that are queued when we start are applied, anything
+        arriving in the meantime waits for the next frame.
+        """
+        commands = self.commands
+        if not commands:
+            return
+
+        pending = []
+        for i in range(len(commands)):
+            full_path, args = commands.popleft()
+            try:
+                pending.append((self.route(full_path), args))
+            except Exception:
+                # a path that doesn't parse mustn't take the mainloop down
+                # either, or the calls queued after it
+                traceback.print_exc()
+
+        # walk backwards so the latest write to each knob wins
+        batch = []
+        seen = set()
+        for route, args in reversed(pending):
+            if route.coalesce_key is not None:
+                key = (route.coalesce_key, len(args))
+                if key in seen:
+                    continue
+                seen.add(key)
+            batch.append((route, args))
+
+        self.commands_applied += len(batch)
+        self.commands_coalesced += len(pending) - len(batch)
+
+        for route, args in reversed(batch):
+            try:
+                self.call_route(route, args)
+            except Exception:
+                # a bad OSC message mustn't take the mainloop down with it
+                traceback.print_exc()
+
+    def call_route(self, route, args):
+        """Call the handler of a Route with the OSC args."""
+        if route.handler is None:
+            return
+
+        # If we have inferred kwargs, use them
+        # Otherwise, use whatever is in passed args
+        if route.kwargs:
+            route.handler(**route.kwargs)
+        else:
+            route.handler(*args)
+
+    def route(self, full_path):
+        """
+        Return the Route for an OSC path.
+
+        Parsed paths are kept in a small LRU cache (self.routes), since the
+        same few hundred paths tend to come in over and over.
+        """
+
+        route = self.routes.get(full_path)
+        if route is None:
+            self.route_misses += 1
+            route = self.parse_route(full_path)
+            self.routes[full_path] = route
+            if len(self.routes) > self.route_cache_size:
+                self.routes.popitem(last=False)
+        else:
+            self.route_hits += 1
+            try:
+                self.routes.move_to_end(full_path)
+            except KeyError:
+                # evicted by another thread in the meantime, no harm done
+                pass
+
+        return route
+
+    def parse_route(self, full_path):
+        """
+        Turn an OSC path into a Route: the namespace, the handler to call and
+        the kwargs encoded in the path. handler is None if the path doesn't
+        lead anywhere.
         """
 
         osc_args = full_path.split('/')
@@ -580,6 +1217,12 @@ class Rosary:
         # The actual function name, in that namespace: 'add_effect', etc.
         fn_name = osc_args.pop(0)
 
+        # /rosary/effect/<id>/<knob> turns the knob of one effect
+        effect_id = None
+        if namespace == 'rosary' and fn_name == 'effect' and len(osc_args) >= 2:
+            effect_id = ast.literal_eval(osc_args.pop(0))
+            fn_name = osc_args.pop(0)
+
         # Finally, the rest of the parsed args are expected to actually
         # represent key/value pairs, so expect there to be an even-numbered
         # count of items
@@ -592,36 +1235,43 @@ class Rosary:
             # strings representing floats to floats
             try:
                 implied_val = ast.literal_eval(implied_val)
-            except ValueError:
+            except (ValueError, SyntaxError):
                 pass
 
             inferred_kwargs[implied_arg] = implied_val
 
-        # If we have inferred kwargs, use them
-        # Otherwise, use whatever is in passed args
-        # If nothing, assume a 1 from passed args
-        if namespace == 'rosary':
-            if inferred_kwargs:
-                # We expect to mostly end up here
-                if fn_name in self.dm.exposed_methods.keys():
-                    self.dm.exposed_methods[fn_name](self, **inferred_kwargs)
-                # But in some rare cases, we set some reasonable defaults
-                # even if you're being COMPLETELY lazy
-                else:
-                    self.dm.exposed_methods[fn_name](self, *args)
+        handler = None
+        if effect_id is not None:
+            handler = functools.partial(self.turn_effect_knob, effect_id, fn_name)
+
+        elif namespace == 'rosary':
+            fn = self.dm.exposed_methods.get(fn_name)
+            if fn is not None:
+                handler = functools.partial(fn, self)
 
         elif namespace == 'effect':
-            if inferred_kwargs:
-                self.turn_knob(fn_name, **inferred_kwargs)
-            else:
-                self.turn_knob(fn_name, *args)
-                
+            # resolved at call time, the set of running effects changes
+            handler = functools.partial(self.turn_knob, fn_name)
+
         elif namespace == 'trigger':
-            if inferred_kwargs:
-                self.fire_trigger(fn_name, **inferred_kwargs)
-            else:
-                self.fire_trigger(fn_name, *args)
-                
+            handler = functools.partial(self.fire_trigger, fn_name)
+
+        coalesce_key = None
+        if namespace == 'effect':
+            coalesce_key = (fn_name, tuple(inferred_kwargs))
+        elif effect_id is not None:
+            coalesce_key = (effect_id, fn_name, tuple(inferred_kwargs))
+
+        return Route(namespace, handler, inferred_kwargs, coalesce_key)
+
+    def route_cache_stats(self):
+        """Return the OSC route cache hit/miss counters as a dict."""
+        return {
+            'hits': self.route_hits,
+            'misses': self.route_misses,
+            'size': len(self.routes),
+            'max_size': self.route_cache_size,
+        }
 
     def map_to_dispatcher(self):
         """
@@ -630,6 +1280,10 @@ class Rosary:
         Less "Wild Things" and more "Where the Wild Things Are."
         """
 
+        # running headless, nobody to take calls from
+        if self.dispatcher is None:
+            return
+
         self.dispatcher.map("/rosary/*", self.route_osc_call)
         self.dispatcher.map("/effect/*", self.route_osc_call)
         self.dispatcher.map("/trigger/*", self.route_osc_call)
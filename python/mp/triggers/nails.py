@@ -1,4 +1,3 @@
-import random
 from mp.effects import bounce, sine_wave
 from mp.triggers import trigger
 from mp import color
@@ -19,35 +18,35 @@ class LeftNail(trigger.Trigger):
                                 rosary=self.rosary,
                                 duration=120)
         # Shitty hack
-        bounce1.id = random.randrange(1000, 9999)
+        bounce1.id = self.rosary.random.randrange(1000, 9999)
 
         bounce2 = bounce.Bounce(self.rosary.set_registry.get('all'),
                                 color.Color(0.8, 0.3, 0.5),
                                 rosary=self.rosary,
                                 duration=117,
                                 delay=3)
-        bounce2.id = random.randrange(1000, 9999)
+        bounce2.id = self.rosary.random.randrange(1000, 9999)
 
         bounce3 = bounce.Bounce(self.rosary.set_registry.get('all'),
                                 color.Color(0.8, 0.3, 0.5),
                                 rosary=self.rosary,
                                 duration=114,
                                 delay=6)
-        bounce3.id = random.randrange(1000, 9999)
+        bounce3.id = self.rosary.random.randrange(1000, 9999)
 
         sinewav = sine_wave.SineWave(self.rosary.set_registry.get('all'),
                                      color.Color(0.0, 0.3, 0.3),
                                      rosary=self.rosary,
                                      duration=120,
                                      delay=75)
-        sinewav.id = random.randrange(1000, 9999)
+        sinewav.id = self.rosary.random.randrange(1000, 9999)
 
         threeps = sine_wave.ThreePhaseSineWave(self.rosary.set_registry.get('all'),
                                                color.Color(1.0, 1.0, 1.0),
                                                rosary=self.rosary,
                                                duration=180,
                                                delay=210)
-        threeps.id = random.randrange(1000, 9999)
+        threeps.id = self.rosary.random.randrange(1000, 9999)
 
 
         self.rosary.add_effect_object(bounce1)
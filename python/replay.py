@@ -0,0 +1,81 @@
+#!/usr/bin/python3
+"""Play back a recording made with server.py --record (or /rosary/set_recording)
+
+Sends the recorded packets, exactly as they were sent, to oscled or one of
+the simulators - no effect engine needed. Handy for load testing receivers
+and reproducing glitches with real show traffic.
+
+    ./replay.py show.mprl                       # in real time, to 127.0.0.1:5005
+    ./replay.py show.mprl --speed 4 --port 5010 # 4x as fast
+    ./replay.py show.mprl --speed 0             # as fast as possible
+    ./replay.py show.mprl --start 120 --loop    # from 2 minutes in, over and over
+"""
+import argparse
+import time
+
+from mp import output, recorder
+
+
+def replay(recording, sink, speed=1.0, start=0.0, clock=time.monotonic, sleep=time.sleep):
+    """
+    Send the frames of recording from start (seconds into it) on to sink.
+    With speed 0 frames are sent as fast as possible, otherwise they keep
+    their recorded spacing, divided by speed.
+    Returns (frames, packets, bytes) sent.
+    """
+    first = recording.seek(start)
+    frames = packets = sent = 0
+    t0 = None
+
+    for timestamp, payloads in recording.frames(first):
+        if speed > 0:
+            if t0 is None:
+                t0 = clock() - (timestamp / speed)
+            delay = t0 + (timestamp / speed) - clock()
+            if delay > 0:
+                sleep(delay)
+
+        for payload in payloads:
+            sink.send(payload)
+            sent += len(payload)
+        sink.end_frame()
+        frames += 1
+        packets += len(payloads)
+
+    return frames, packets, sent
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("recording",
+        help="the recording to play")
+    parser.add_argument("--ip",
+        default="127.0.0.1", help="The ip to send messages to")
+    parser.add_argument("--port",
+        type=int, default=5005, help="The port to send messages to")
+    parser.add_argument("--speed",
+        type=float, default=1.0, help="playback speed, 0 for as fast as possible")
+    parser.add_argument("--start",
+        type=float, default=0.0, help="start this many seconds into the recording")
+    parser.add_argument("--loop",
+        action="store_true", help="play the recording over and over")
+
+    args = parser.parse_args()
+
+    rec = recorder.Recording(args.recording)
+    sink = output.UDPSink(args.ip, args.port)
+    # at full speed, wait for room in the socket buffer rather than fail
+    sink.sock.setblocking(True)
+    print("{}: {} frames, {:.1f} s".format(
+        args.recording, len(rec), rec.index['timestamp'][-1] if len(rec) else 0))
+
+    while True:
+        start = time.monotonic()
+        frames, packets, sent = replay(rec, sink, speed=args.speed, start=args.start)
+        elapsed = time.monotonic() - start
+        print("sent {} frames, {} packets, {} bytes in {:.2f} s ({:.1f} fps, {:.1f} MB/s)".format(
+            frames, packets, sent, elapsed,
+            frames / elapsed if elapsed else 0, sent / elapsed / 1e6 if elapsed else 0))
+        if not args.loop:
+            break
@@ -5,12 +5,17 @@ This program listens to several addresses, and prints some information about
 received packets.
 """
 import argparse
+import asyncio
+import functools
+import logging
 import math
+import signal
+import sys
 
 from pythonosc import dispatcher
 from pythonosc import osc_server
 
-from mp import rosary
+from mp import processes, rosary
 
 def print_dispatcher_paths(unused_addr, args):
     """
@@ -32,6 +37,67 @@ def print_dispatcher_paths(unused_addr, args):
         print("/effect/{}".format(k))
 
 
+def setup_render(args, r):
+    """Apply the command line options that are about rendering."""
+    if args.seed is not None:
+        r.seed(args.seed)
+    if args.clips:
+        r.load_clips(args.clips)
+    if args.render_threads > 1:
+        r.set_render_threads(args.render_threads)
+    r.pipeline_depth = args.pipeline
+    if args.governor:
+        r.set_governor()
+
+
+def setup_send(args, r):
+    """Apply the command line options that are about sending frames."""
+    r.set_output_mode(args.output_mode)
+    if args.bundle:
+        r.set_bundling(latency=args.latency)
+    if args.record:
+        r.set_recording(args.record)
+    if args.interpolate > 1:
+        r.set_interpolation(args.interpolate)
+
+
+def serve_processes(args, d):
+    """
+    Render and send frames in processes of their own (see
+    mp.processes.RosaryProcesses), this one just passes OSC calls on.
+    """
+    procs = processes.RosaryProcesses(args.ip, args.port,
+                                      render_setup=functools.partial(setup_render, args),
+                                      send_setup=functools.partial(setup_send, args))
+    for path in ("/rosary/*", "/effect/*", "/trigger/*"):
+        d.map(path, procs.route_osc_call)
+    procs.start()
+    # clean up (the shared memory, mostly) when we're killed too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    server = osc_server.BlockingOSCUDPServer((args.listen_ip, args.listen_port), d)
+    print("Serving on {}".format(server.server_address))
+    try:
+        server.serve_forever()
+    finally:
+        procs.stop()
+
+
+async def serve_async(args, d, r):
+    """
+    Serve OSC and run the rosary's mainloop on the same event loop: messages
+    are handled in between frames, never during one.
+    """
+    server = osc_server.AsyncIOOSCUDPServer(
+        (args.listen_ip, args.listen_port), d, asyncio.get_running_loop())
+    transport, protocol = await server.create_serve_endpoint()
+    print("Serving on {}".format(transport.get_extra_info('sockname')))
+    try:
+        await r.mainloop_async()
+    finally:
+        transport.close()
+
+
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser()
@@ -45,10 +111,51 @@ if __name__ == "__main__":
         type=int, default=5005, help="The port to send messages to")
     parser.add_argument("--interactive",
         type=bool, default=False, help="start interactive shell");
+    parser.add_argument("--asyncio",
+        action="store_true",
+        help="receive OSC and render frames on one asyncio loop, no threads (no --interactive)");
+    parser.add_argument("--processes",
+        action="store_true",
+        help="render and send frames in separate processes, away from OSC traffic (no --interactive)");
+    parser.add_argument("--bundle",
+        action="store_true",
+        help="send each frame as one OSC bundle");
+    parser.add_argument("--latency",
+        type=float, default=0.0,
+        help="with --bundle, timetag frames to be shown this many seconds after they're sent");
+    parser.add_argument("--clips",
+        help="directory of baked triggers (*.clip, see bake.py) to play instead of running them");
+    parser.add_argument("--render-threads",
+        type=int, default=1,
+        help="render effects with this many threads (1 renders them one by one, in order)");
+    parser.add_argument("--pipeline",
+        type=int, default=0,
+        help="render up to this many frames ahead of the one being sent (OSC calls take effect that much later)");
+    parser.add_argument("--governor",
+        action="store_true",
+        help="lower the frame rate (30, 24, 20 fps) while rendering can't keep up");
+    parser.add_argument("--seed",
+        help="seed for random effects, makes a show repeatable");
+    parser.add_argument("--interpolate",
+        type=int, default=1,
+        help="send this many frames per frame rendered, blended in between, for smoother motion");
+    parser.add_argument("--record",
+        help="record every frame sent to this file (play it back with replay.py)");
+    parser.add_argument("--output-mode",
+        choices=["full", "delta"], default="full",
+        help="send every bead every frame, or only the beads that changed");
 
     args = parser.parse_args()
+    if args.asyncio and (args.pipeline > 0 or args.interpolate > 1):
+        parser.error("--asyncio renders and sends on one loop, it can't do --pipeline or --interpolate")
+    # /rosary/stats and friends report through logging
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s: %(message)s")
 
     d = dispatcher.Dispatcher()
+    if args.processes:
+        serve_processes(args, d)
+        exit(0)
+
     # Since the Rosary itself won't be instantiated often, I don't feel
     # bad about requiring that the dispatcher be passed
     r = rosary.Rosary(args.ip, args.port, d)
@@ -58,12 +165,15 @@ if __name__ == "__main__":
     # (Especially for checking that paths for cleared effects are removed)
     d.map("/paths", print_dispatcher_paths, r)
 
-    # Since the Rosary itself won't be instantiated often, I don't feel
-    # bad about requiring that the dispatcher be passed
-    r = rosary.Rosary(args.ip, args.port, d)
-    r.start(interactive=args.interactive)
+    setup_render(args, r)
+    setup_send(args, r)
 
-    server = osc_server.ThreadingOSCUDPServer(
-        (args.listen_ip, args.listen_port), d)
-    print("Serving on {}".format(server.server_address))
-    server.serve_forever()
+    if args.asyncio:
+        asyncio.run(serve_async(args, d, r))
+    else:
+        r.start(interactive=args.interactive)
+
+        server = osc_server.ThreadingOSCUDPServer(
+            (args.listen_ip, args.listen_port), d)
+        print("Serving on {}".format(server.server_address))
+        server.serve_forever()
@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+# the mp package lives next to this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mp import output, rosary
+
+
+class ListSink(output.NullSink):
+    """Keeps a copy of every packet sent to it, and counts frames."""
+
+    def __init__(self):
+        self.packets = []
+        self.frames = 0
+
+    def send(self, payload):
+        self.packets.append(bytes(payload))
+
+    def end_frame(self):
+        self.frames += 1
+
+
+@pytest.fixture
+def sink():
+    return ListSink()
+
+
+@pytest.fixture
+def headless(sink):
+    """A seeded Rosary that sends to a ListSink."""
+    r = rosary.Rosary(sink=sink)
+    r.seed(0)
+    yield r
+    r.clear_effects()
@@ -0,0 +1,42 @@
+import gc
+import weakref
+
+from mp import output, rosary
+from mp.effects import effect
+
+
+def indices(beads):
+    return [bead.index for bead in beads]
+
+
+def test_ccw_turns_the_ring_around(headless):
+    beads, frame_buffer, bead_index = headless.bead_sets.get(headless.set_registry['ring'], 'ccw')
+    # where the stem meets the ring, then the other way around
+    assert indices(beads) == [4] + list(range(59, 4, -1))
+    assert frame_buffer is headless.rosary_buffer
+
+
+def test_ccw_keeps_base_and_cross_in_order(headless):
+    for name in ('base', 'cross'):
+        bead_set = headless.set_registry[name]
+        cw = headless.bead_sets.get(bead_set, 'cw')[0]
+        ccw = headless.bead_sets.get(bead_set, 'ccw')[0]
+        assert ccw == cw, name
+        assert indices(ccw) == sorted(indices(ccw)), name
+
+
+def test_cache_goes_away_with_the_rosary():
+    r = rosary.Rosary(sink=output.NullSink())
+    canvas = weakref.ref(r.canvas)
+    assert len(r.bead_sets)
+    del r
+    gc.collect()
+    assert canvas() is None
+
+
+def test_cache_is_bounded():
+    r = rosary.Rosary(sink=output.NullSink())
+    cache = effect.BeadSetCache(maxsize=4)
+    for i in range(10):
+        cache.get(frozenset(r.beads[i:i + 5]))
+    assert len(cache) == 4
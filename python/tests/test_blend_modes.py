@@ -0,0 +1,79 @@
+import numpy
+import pytest
+
+from mp import frame
+
+
+# the blend functions themselves, one channel at a time
+REFERENCE_MODES = {
+    'over': lambda b, s: s,
+    'add': lambda b, s: min(b + s, 1.0),
+    'max': max,
+    'multiply': lambda b, s: b * s,
+}
+
+
+def reference_composite(dst, src, mode, opacity):
+    """One bead, straight from the compositing equations: the blended
+    color where there's something underneath, then Porter-Duff over."""
+    src_a = src[3] * opacity
+    dst_a = dst[3]
+    a = src_a + (dst_a * (1 - src_a))
+    out = numpy.array(dst, dtype=float)
+    for c in range(3):
+        blended = ((1 - dst_a) * src[c]) + (dst_a * REFERENCE_MODES[mode](dst[c], src[c]))
+        out[c] = ((src_a * blended) + (dst_a * (1 - src_a) * dst[c])) / a if a else 0
+    out[3] = a
+    if src_a > 0:
+        out[4] = src[4]
+    return out
+
+
+def random_buffer(rng, count, name):
+    fb = frame.FrameBuffer(name, count)
+    fb.data[:, 0:3] = rng.random((count, 3))
+    # opaque, transparent and everything in between
+    fb.data[:, 3] = rng.choice([0.0, 0.25, 0.5, 1.0], size=count)
+    fb.data[:, 4] = rng.integers(0, 256, size=count)
+    return fb
+
+
+@pytest.mark.parametrize('mode', sorted(frame.BLEND_MODES))
+@pytest.mark.parametrize('opacity', [1.0, 0.5])
+def test_composite_matches_reference(mode, opacity):
+    rng = numpy.random.default_rng(1)
+    dst = random_buffer(rng, 64, 'dst')
+    src = random_buffer(rng, 64, 'src')
+    expected = numpy.array([reference_composite(d, s, mode, opacity)
+                            for d, s in zip(dst.data, src.data)])
+
+    dst.composite(src, mode, opacity)
+    numpy.testing.assert_allclose(dst.data, expected, atol=1e-12)
+
+
+def test_add_effect_takes_blend_mode_and_opacity(headless):
+    id = headless.add_effect(name='set_color', bead_set='ring', color='red',
+                             blend_mode='add', opacity=0.5)
+    effect = headless.effect_knobs[id][0]
+    assert (effect.blend_mode, effect.opacity) == ('add', 0.5)
+
+
+def test_blend_mode_knob_turns_one_effect(headless):
+    first = headless.add_effect(name='set_color', bead_set='ring', color='red')
+    second = headless.add_effect(name='set_color', bead_set='ring', color='blue')
+
+    headless.route_osc_call('/rosary/effect/{}/set_blend_mode'.format(second), 'max')
+    headless.route_osc_call('/rosary/effect/{}/set_opacity/opacity/0.25'.format(second))
+    # not for everybody at once
+    headless.route_osc_call('/effect/set_blend_mode', 'multiply')
+
+    effects = {id: headless.effect_knobs[id][0] for id in (first, second)}
+    assert (effects[first].blend_mode, effects[first].opacity) == ('over', 1.0)
+    assert (effects[second].blend_mode, effects[second].opacity) == ('max', 0.25)
+
+
+def test_add_effect_rgb_is_opaque(headless):
+    id = headless.add_effect(name='set_color', bead_set='stem', r=0.5, g=0.25, b=0.0)
+    headless.run_frames(2)
+    stem = headless.effect_knobs[id][0].bead_index
+    numpy.testing.assert_allclose(headless.canvas.data[stem, 0:4], [[0.5, 0.25, 0.0, 1.0]] * len(stem))
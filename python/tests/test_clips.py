@@ -0,0 +1,23 @@
+from mp import clip
+from mp.effects import clip_player
+
+
+def test_clip_player_cant_be_added_by_name(headless):
+    assert 'clip_player' not in headless.effect_registry
+    assert headless.add_effect(name='clip_player', bead_set='all') is None
+    assert not headless.bin.effects
+
+
+def test_baked_trigger_plays_a_clip(headless, tmp_path):
+    path = str(tmp_path / 'red.clip')
+    frames = clip.bake(headless, lambda r: r.add_effect(name='set_color', bead_set='ring',
+                                                        color='red', duration=3),
+                       path)
+    assert frames > 0
+    headless.clear_effects()
+    headless.load_clip(path)
+
+    headless.fire_trigger('red')
+    players = [e for e in headless.bin.effects if isinstance(e, clip_player.ClipPlayer)]
+    assert len(players) == 1
+    assert players[0].clip is headless.clip_registry['red']
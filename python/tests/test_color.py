@@ -0,0 +1,52 @@
+import pytest
+
+from mp import color
+
+
+def fade(time=8):
+    # black to white, so r is where the fade is at
+    return color.ColorFade(color.Color(0, 0, 0), color.Color(1, 1, 1), time=time)
+
+
+def test_overshoot_reflects_off_the_end():
+    c = fade()
+    c.next(12)
+    assert c.delta == 0.5 and c.r == 0.5
+    # on the way back
+    c.next(2)
+    assert c.delta == 0.25
+
+
+def test_overshoot_reflects_off_the_start():
+    c = fade()
+    c.next(4)
+    c.next(4)
+    assert c.delta == 1.0
+    c.next(10)
+    assert c.delta == 0.25 and c.r == 0.25
+    # on the way up again
+    c.next(2)
+    assert c.delta == 0.5
+
+
+def test_overshoot_past_both_ends():
+    c = fade()
+    c.next(4)
+    # up to one, back down to zero and half way up again
+    c.next(16)
+    assert c.delta == 0.5
+    c.next(1)
+    assert c.delta == 0.625
+
+
+@pytest.mark.parametrize('steps', [2, 3, 4, 7, 16, 29])
+def test_big_steps_stay_in_phase(steps):
+    one_by_one = fade(time=30)
+    in_steps = fade(time=30)
+    for _ in range(10):
+        for step in range(steps):
+            one_by_one.next()
+        in_steps.next(steps)
+        assert in_steps.delta == pytest.approx(one_by_one.delta)
+        assert 0 <= in_steps.delta <= 1
+        assert in_steps.r == pytest.approx(one_by_one.r)
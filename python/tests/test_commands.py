@@ -0,0 +1,54 @@
+import pytest
+
+
+@pytest.fixture
+def calls(headless):
+    """Map an /effect/probe knob that records what it's called with, and
+    queue calls as the mainloop would."""
+    calls = []
+    headless.knobs['probe'] = {1: lambda *args, **kwargs: calls.append((args, kwargs))}
+    headless.run_mainloop = True
+    yield calls
+    headless.run_mainloop = False
+
+
+def test_last_write_to_a_knob_wins(headless, calls):
+    for value in (1, 2, 3):
+        headless.route_osc_call('/effect/probe', value)
+    headless.apply_commands()
+    assert calls == [((3,), {})]
+    assert headless.commands_coalesced == 2
+
+
+def test_different_arity_is_not_coalesced(headless, calls):
+    headless.route_osc_call('/effect/probe', 1)
+    headless.route_osc_call('/effect/probe', 1, 2)
+    headless.route_osc_call('/effect/probe', 3)
+    headless.apply_commands()
+    # the two one-argument calls coalesce, into the later one's place
+    assert calls == [((1, 2), {}), ((3,), {})]
+
+
+def test_different_path_kwargs_are_not_coalesced(headless, calls):
+    headless.route_osc_call('/effect/probe/value/1')
+    headless.route_osc_call('/effect/probe/other/2')
+    headless.route_osc_call('/effect/probe/value/3')
+    headless.apply_commands()
+    assert calls == [((), {'other': 2}), ((), {'value': 3})]
+
+
+def test_rosary_calls_are_all_applied_in_order(headless, calls):
+    headless.route_osc_call('/rosary/set_fps', 20)
+    headless.route_osc_call('/rosary/set_fps', 24)
+    headless.apply_commands()
+    assert headless.frame_time == 1 / 24
+    assert headless.commands_applied == 2
+    assert headless.commands_coalesced == 0
+
+
+def test_bad_paths_dont_stop_the_batch(headless, calls, capsys):
+    headless.route_osc_call('/rosary/add_effect/name/{[]:1}')
+    headless.route_osc_call('/rosary')
+    headless.route_osc_call('/effect/probe', 1)
+    headless.apply_commands()
+    assert calls == [((1,), {})]
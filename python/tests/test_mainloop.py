@@ -0,0 +1,15 @@
+import asyncio
+
+import pytest
+
+
+def test_async_mainloop_refuses_a_pipeline(headless):
+    headless.pipeline_depth = 3
+    with pytest.raises(ValueError):
+        asyncio.run(headless.mainloop_async())
+
+
+def test_async_mainloop_refuses_interpolation(headless):
+    headless.set_interpolation(2)
+    with pytest.raises(ValueError):
+        asyncio.run(headless.mainloop_async())
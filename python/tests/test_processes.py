@@ -0,0 +1,42 @@
+import numpy
+
+from mp import interpolator, processes
+
+
+def test_frame_channel_carries_frames_and_frame_times():
+    shape = processes.canvas_shape()
+    writer = processes.FrameChannel(shape, create=True)
+    reader = processes.FrameChannel(shape, name=writer.name)
+    try:
+        out = numpy.empty(shape)
+        assert reader.read(out) == -1
+
+        rng = numpy.random.default_rng(0)
+        for number, frame_time in enumerate([1 / 30, 1 / 30, 1 / 20, 1 / 60]):
+            data = rng.random(shape)
+            writer.publish(number, data, frame_time)
+            assert reader.read(out) == number
+            assert reader.frame_time == frame_time
+            numpy.testing.assert_array_equal(out, data)
+    finally:
+        reader.close()
+        writer.close()
+        writer.unlink()
+
+
+def test_interpolator_takes_the_renderers_frame_time(headless):
+    fi = interpolator.FrameInterpolator(headless, factor=2)
+    fi.push(headless.canvas.data, 1 / 120)
+    assert fi.frame_time == 1 / 120
+    # the local rosary's is only a fallback
+    fi.push(headless.canvas.data)
+    assert fi.frame_time == headless.frame_time
+
+
+def test_send_frame_passes_frame_time_on(headless):
+    headless.set_interpolation(2)
+    try:
+        headless.send_frame(1 / 120)
+        assert headless.interpolator.frame_time == 1 / 120
+    finally:
+        headless.stop_interpolator()
@@ -0,0 +1,34 @@
+import logging
+
+from mp import profiler
+
+
+class Effect:
+    def __init__(self, id, name='throb'):
+        self.id = id
+        self.name = name
+
+
+def test_removed_effects_keep_their_totals():
+    p = profiler.EffectProfiler(max_finished=2)
+    effects = [Effect(i) for i in range(1, 4)]
+    p.run(effects, lambda effect: None)
+
+    for effect in effects:
+        p.forget(effect.id)
+
+    summary = p.summary()
+    assert summary['effects'] == {}
+    # only the last max_finished are kept
+    assert list(summary['finished']) == ['2', '3']
+    assert summary['finished']['3']['calls'] == 1
+    assert summary['finished']['3']['name'] == 'throb'
+
+
+def test_stats_are_logged(headless, caplog):
+    headless.set_profiling(1)
+    headless.run_frames(3)
+    with caplog.at_level(logging.INFO, logger='mp.rosary'):
+        stats = headless.stats()
+    assert stats['effects']['frames'] == 3
+    assert '"routes"' in caplog.text
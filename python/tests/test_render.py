@@ -0,0 +1,51 @@
+import pytest
+
+from mp import rosary
+
+from conftest import ListSink
+
+
+# overlapping effects, some of them translucent, none of them random so
+# the threaded render has nothing to draw in a different order
+SCENE = [
+    dict(name='throb', bead_set='all', color='red'),
+    dict(name='bounce', bead_set='ring', color='green', speed=1, length=3),
+    dict(name='sine_wave', bead_set='cross', r=0.0, g=0.3, b=0.3),
+    dict(name='looper', bead_set='base', r=0.2, g=0.3, b=1.0, speed=0.5, length=2),
+    dict(name='wheel', bead_set='ring', length=2.5),
+    dict(name='casino', bead_set='cross', color='yellow', speed=3),
+    dict(name='strobe', bead_set='base', color='white'),
+    dict(name='set_color', bead_set='stem', r=0.5, g=0.5, b=0.5),
+    dict(name='shooter', bead_set='ring', color='cyan', speed=1, length=2),
+    dict(name='throb', bead_set='cross', color='blue'),
+]
+
+
+def render_scene(frames=120, layered=True, threads=1):
+    sink = ListSink()
+    r = rosary.Rosary(sink=sink)
+    r.seed(0)
+    r.bin.layered = layered
+    r.set_render_threads(threads)
+    try:
+        for kwargs in SCENE:
+            assert r.add_effect(**kwargs) is not None, kwargs['name']
+        r.run_frames(frames)
+    finally:
+        r.set_render_threads(1)
+        r.clear_effects()
+    assert sink.frames == frames
+    return sink.packets
+
+
+@pytest.fixture(scope='module')
+def reference():
+    return render_scene()
+
+
+def test_layered_composite_matches_drawing_straight_on_the_canvas(reference):
+    assert render_scene(layered=False) == reference
+
+
+def test_threaded_render_matches_one_thread(reference):
+    assert render_scene(threads=4) == reference
@@ -0,0 +1,53 @@
+import numpy
+from pythonosc.osc_message import OscMessage
+
+from mp import frame
+from mp.rosary import Bead, Updater
+
+from conftest import ListSink
+
+
+def make_updater(count=60, interval=5):
+    fb = frame.FrameBuffer('rosary', count)
+    sink = ListSink()
+    updater = Updater(name='rosary', bead_list=[Bead(i, fb) for i in range(count)],
+                      frame_buffer=fb, sink=sink)
+    updater.delta = True
+    updater.keyframe_interval = interval
+    return fb, updater, sink
+
+
+def apply_message(received, packet):
+    """Do what a receiver does with a /bead message, return its length."""
+    name, base, length, blob = OscMessage(packet).params
+    received[base:base + length] = numpy.frombuffer(blob, dtype='>u2').reshape(length, 4)
+    return length
+
+
+def test_delta_messages_rebuild_the_frame():
+    fb, updater, sink = make_updater()
+    rng = numpy.random.default_rng(0)
+    received = numpy.zeros((len(fb), 4), dtype='>u2')
+
+    for n in range(50):
+        # change a few scattered beads, and sometimes none at all
+        for i in rng.integers(0, len(fb), size=n % 4):
+            fb.data[i, 0:3] = rng.random(3)
+        sink.packets = []
+        updater.update()
+        for packet in sink.packets:
+            apply_message(received, packet)
+        numpy.testing.assert_array_equal(received, updater.encoder.payload)
+
+
+def test_keyframe_every_interval_frames():
+    fb, updater, sink = make_updater(interval=5)
+    keyframes = []
+    for n in range(21):
+        fb.data[n % len(fb), 0] = (n % 7) / 7
+        sink.packets = []
+        updater.update()
+        full = [p for p in sink.packets if OscMessage(p).params[2] == len(fb)]
+        if full:
+            keyframes.append(n)
+    assert keyframes == [0, 5, 10, 15, 20]
@@ -9,6 +9,8 @@
 #include <atomic>
 #include <iostream>
 #include <string>
+#include <chrono>
+#include <thread>
 
 #include "IPlatformSerial.h"
 #include "OSCServer.h"
@@ -20,11 +22,23 @@ const int OSCServer::BEAD_ROSARY = 0;
 const int OSCServer::BEAD_BASES = 1;
 const int OSCServer::BEAD_CROSS = 2;
 
+// seconds between the NTP epoch (1900) and the Unix epoch (1970)
+static const uint32_t NTP_EPOCH_OFFSET = 2208988800U;
+
+// timetagged frames waiting to be shown, per LED interface: beyond this the
+// oldest are dropped
+static const size_t MAX_PENDING_FRAMES = 8;
+// how far ahead a timetag may ask for a frame to be shown, anything later
+// (clock skew, a bogus timetag) is shown this soon instead
+static const chrono::milliseconds MAX_PRESENT_LATENCY(500);
+
 
 OSCServer::OSCServer(string ip, string port) : m_ip(ip), m_port(port)
 {
     received = 0;
     m_iface_count = 0;
+    m_bundle_depth = 0;
+    m_bundle_dirty = false;
     
     lo_server_thread osc_st;
     struct sockaddr_in sa;
@@ -47,6 +61,19 @@ OSCServer::OSCServer(string ip, string port) : m_ip(ip), m_port(port)
         return;
     }
 
+    // A frame may come as a bundle of /bead messages. Apply the whole
+    // bundle, then update the LEDs once (see osc_bundle_start/end).
+    // Bundles are dispatched as soon as they arrive, rather than queued by
+    // liblo until their timetag, so the start and end handlers always
+    // bracket the bundle's messages; the timetag is honored by the update
+    // threads instead.
+    lo_server osc_s = lo_server_thread_get_server(osc_st);
+    lo_server_enable_queue(osc_s, 0, 1);
+    lo_server_add_bundle_handlers(osc_s,
+                                  &OSCServer::osc_bundle_start,
+                                  &OSCServer::osc_bundle_end,
+                                  this);
+
     // make a ServerThread object from the lo_server_thread we made above
     m_st.reset(new lo::ServerThread(osc_st));
 
@@ -149,6 +176,59 @@ int OSCServer::osc_method_bead_float(lo_arg **argv)
 
 int OSCServer::osc_method_update(lo_arg **argv)
 {
+    frame_updated();
+
+    return 0;
+}
+
+
+// called by liblo before dispatching the messages in a bundle
+int OSCServer::osc_bundle_start(lo_timetag time, void *user_data)
+{
+    OSCServer *server = static_cast<OSCServer *>(user_data);
+
+    if (server->m_bundle_depth++ == 0) {
+        server->m_bundle_dirty = false;
+        server->m_bundle_present_at = chrono::system_clock::time_point();
+
+        // anything but "immediately" is the time the frame should be shown at
+        if (!(time.sec == LO_TT_IMMEDIATE.sec && time.frac == LO_TT_IMMEDIATE.frac)) {
+            auto since_epoch = chrono::seconds(int64_t(time.sec) - NTP_EPOCH_OFFSET) +
+                chrono::nanoseconds((uint64_t(time.frac) * 1000000000) >> 32);
+            server->m_bundle_present_at = chrono::system_clock::time_point(
+                chrono::duration_cast<chrono::system_clock::duration>(since_epoch));
+        }
+    }
+
+    return 0;
+}
+
+
+// called by liblo after dispatching the messages in a bundle
+int OSCServer::osc_bundle_end(void *user_data)
+{
+    OSCServer *server = static_cast<OSCServer *>(user_data);
+
+    if (--server->m_bundle_depth == 0 && server->m_bundle_dirty) {
+        // the whole frame is in, now it can go out to the LEDs
+        for (auto it = server->m_led_ifaces.begin(); it != server->m_led_ifaces.end(); ++it) {
+            (*it)->notify_update_thread(server->m_bundle_present_at);
+        }
+        server->m_bundle_dirty = false;
+    }
+
+    return 0;
+}
+
+
+// LEDs were set: update them now, or at the end of the bundle we're in
+void OSCServer::frame_updated()
+{
+    if (m_bundle_depth > 0) {
+        m_bundle_dirty = true;
+        return;
+    }
+
     for (auto it = m_led_ifaces.begin(); it != m_led_ifaces.end(); ++it) {
         (*it)->notify_update_thread();
     }
@@ -217,9 +297,9 @@ int OSCServer::osc_method_bead(lo_arg **argv)
     }
 
     // actually transmit the data to the LEDs
-    for (auto it = m_led_ifaces.begin(); it != m_led_ifaces.end(); ++it) {
-        (*it)->notify_update_thread();
-    }
+    frame_updated();
+
+    return 0;
 }
 
 
@@ -382,12 +462,18 @@ OSCServer::led_interface::led_interface(std::shared_ptr<IPlatformSerial> const s
     //shared_ptr<OSCServer::ILEDDataFormat> led_format(led_format = led_fmt_factory.create_led_format(cfg));
     m_fmt = led_fmt_factory.create_led_format(cfg);
 
+    run_update_thread = true;
+    m_update_now = false;
     t_update = std::thread(&OSCServer::led_interface::update_thread, this);
 };
 
 
 OSCServer::led_interface::~led_interface() {
-    run_update_thread = false;
+    {
+        lock_guard<mutex> lock(update_mutex);
+        run_update_thread = false;
+    }
+    update_cv.notify_all();
     t_update.join();
     delete led_buf;
 }
@@ -416,35 +502,90 @@ void OSCServer::led_interface::set_xform(float r, float g, float b)
 }
 
 
-void OSCServer::led_interface::update_led_buf()
+void OSCServer::led_interface::update_thread()
 {
-    {
-        lock_guard<mutex> lock(leds_mutex);
-        m_fmt->update(leds);
+    unique_lock<mutex> lock(update_mutex);
+
+    while (true) {
+        update_cv.wait(lock, [this]{
+            return m_update_now || !m_pending.empty() || !run_update_thread;
+        });
+        if (!run_update_thread) {
+            break;
+        }
+
+        if (m_update_now) {
+            // send the LEDs as they are
+            m_update_now = false;
+            lock.unlock();
+            {
+                lock_guard<mutex> leds_lock(leds_mutex);
+                m_fmt->update(leds);
+            }
+            m_ser->send(m_fmt->buf, m_fmt->buf_len);
+            lock.lock();
+            continue;
+        }
+
+        // if we've fallen behind, skip to the latest frame that's due
+        auto now = chrono::system_clock::now();
+        while (m_pending.size() > 1 && m_pending[1].first <= now) {
+            m_pending.pop_front();
+        }
+
+        if (m_pending.front().first > now) {
+            // not due yet: wait for it, without holding the lock, so new
+            // frames can come in (and we can be stopped) meanwhile
+            update_cv.wait_until(lock, m_pending.front().first);
+            continue;
+        }
+
+        std::vector<led_t> frame;
+        frame.swap(m_pending.front().second);
+        m_pending.pop_front();
+
+        lock.unlock();
+        m_fmt->update(frame);
+        m_ser->send(m_fmt->buf, m_fmt->buf_len);
+        lock.lock();
     }
-    m_ser->send(m_fmt->buf, m_fmt->buf_len);
 }
 
 
-void OSCServer::led_interface::update_thread()
+void OSCServer::led_interface::notify_update_thread(chrono::system_clock::time_point present_at)
 {
-    run_update_thread = true;
+    auto now = chrono::system_clock::now();
 
-    while (run_update_thread) {
-        // I don't care about spurious wakeups, so I won't implement
-        // a "ready" variable
+    if (present_at <= now) {
+        // not timetagged, or late already: show the LEDs as they are, now
         {
-            unique_lock<mutex> lock(update_mutex);
-            update_cv.wait(lock);
-            update_led_buf();
+            lock_guard<mutex> lock(update_mutex);
+            m_update_now = true;
         }
+        update_cv.notify_all();
+        return;
     }
-}
 
+    auto latest = now + chrono::duration_cast<chrono::system_clock::duration>(MAX_PRESENT_LATENCY);
+    if (present_at > latest) {
+        present_at = latest;
+    }
 
-void OSCServer::led_interface::notify_update_thread()
-{
-    unique_lock<mutex> lock(update_mutex);
+    // copy the frame now, the next one may overwrite the LEDs before this
+    // one is shown
+    std::vector<led_t> frame;
+    {
+        lock_guard<mutex> lock(leds_mutex);
+        frame = leds;
+    }
+
+    {
+        lock_guard<mutex> lock(update_mutex);
+        if (m_pending.size() >= MAX_PENDING_FRAMES) {
+            m_pending.pop_front();
+        }
+        m_pending.emplace_back(present_at, std::move(frame));
+    }
     update_cv.notify_all();
 }
 
@@ -12,11 +12,14 @@
 #include <lo/lo_cpp.h>
 
 #include <vector>
+#include <deque>
+#include <utility>
 #include <iostream>
 #include <atomic>
 #include <mutex>
 #include <condition_variable>
 #include <thread>
+#include <chrono>
 
 #include "IPlatformSerial.h"
 #include "OSCLedConfig.hpp"
@@ -48,6 +51,9 @@ class OSCServer {
     int osc_method_bead_float(lo_arg **argv);
     int osc_method_update(lo_arg **argv);
     int osc_method_xform(lo_arg **argv);
+    static int osc_bundle_start(lo_timetag time, void *user_data);
+    static int osc_bundle_end(void *user_data);
+    void frame_updated();
     void set_led(int n, led_t led);
     void set_xform(float r, float g, float b);
     void set_led(std::string const &iface_class, int n, led_t led);
@@ -112,8 +118,6 @@ class OSCServer {
 
         ~led_interface();
 
-        void update_led_buf();
-
         //int iface;
         std::shared_ptr<IPlatformSerial> m_ser;
         int m_base;
@@ -140,7 +144,13 @@ class OSCServer {
 
         void set_led(int offset, led_t led);
         void set_xform(float r, float g, float b);
-        void notify_update_thread();
+        // timetagged frames waiting to be shown: when to show them, and a
+        // copy of the LEDs taken when they came in; and whether the LEDs
+        // should be sent as they are, right away. See notify_update_thread()
+        std::deque<std::pair<std::chrono::system_clock::time_point, std::vector<led_t>>> m_pending;
+        bool m_update_now;
+        void notify_update_thread(std::chrono::system_clock::time_point present_at =
+                                  std::chrono::system_clock::time_point());
     };
 
     int m_leds_per_bead;
@@ -157,6 +167,12 @@ class OSCServer {
 
     int m_iface_count;
 
+    // bundles being dispatched (they can nest), whether LEDs were set
+    // inside them, and when the outermost one should be shown
+    int m_bundle_depth;
+    bool m_bundle_dirty;
+    std::chrono::system_clock::time_point m_bundle_present_at;
+
     std::vector<std::shared_ptr<led_interface>> m_led_ifaces;
 };
 